@@ -2,245 +2,816 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
+import re
 import json
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+import click
+import hashlib
+from flask import Flask, Blueprint, current_app, render_template, request, Response, flash, redirect, url_for, stream_with_context, abort, session, make_response, jsonify
+from markupsafe import Markup
+import jinja2
+from jinja2 import FileSystemBytecodeCache
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
+import applog
 from forms import *
+import assets
+import bulk_import
+import synthetic
+from cache import LRUCache, VersionStamps
+from autocomplete import PrefixIndex, normalize_prefix
+from models import db, GENRES, Genre, venue_genres, artist_genres, Venue, Artist, Shows, ShowArchive, bootstrap_schema
+from routing import REPLICA, replica_configured, read_only, read_bind, stick_to_primary
+import dbpool
+import partitions
 from flask_migrate import Migrate
+from sqlalchemy import func, and_, tuple_, literal, select, union_all
+from sqlalchemy.dialects import postgresql
+from itertools import groupby
+from functools import lru_cache
 import datetime
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-# TODO: connect to a local postgresql database
-db = SQLAlchemy(app)
-migrate = Migrate(app, db) 
+moment = Moment()
+migrate = Migrate()
+main = Blueprint('main', __name__, cli_group=None)
+# per worker caches, sized from the config by create_app()
+fragment_cache = LRUCache()
+# venues and artists by id, see cached_record()
+record_cache = LRUCache()
+versions = VersionStamps()
+
+def create_app(test_config=None):
+  '''
+  Builds the app from config.py, updated with `test_config`. Nothing here
+  talks to the database: connections are opened by the first query, and the
+  tables are left to `flask db upgrade` unless SCHEMA_BOOTSTRAP is set (see
+  models.bootstrap_schema).
+  '''
+  app = Flask(__name__)
+  app.config.from_object('config')
+  if test_config:
+    app.config.update(test_config)
+  # TODO: connect to a local postgresql database
+  # pool sizes come from config.py, checkout waits are measured by dbpool
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'].setdefault('poolclass', dbpool.TimedQueuePool)
+  moment.init_app(app)
+  db.init_app(app)
+  migrate.init_app(app, db)
+  if app.config['SCHEMA_BOOTSTRAP']:
+    bootstrap_schema(app)
+  app.register_blueprint(main)
+  # hashed, precompressed static files once `flask build-assets` ran
+  manifest = assets.init_app(app)
+  if not app.config['PAGE_VERSION']:
+    app.config['PAGE_VERSION'] = page_version(app, manifest)
+  app.after_request(stick_to_primary)
+  app.after_request(dbpool.add_server_timing)
+  app.jinja_env.filters['datetime'] = format_datetime
+  # compiled templates shared by the workers, see `flask compile-templates`;
+  # the file names carry the Jinja version, whose bytecode is not portable
+  if app.config['TEMPLATE_CACHE_FOLDER']:
+    os.makedirs(app.config['TEMPLATE_CACHE_FOLDER'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+      app.config['TEMPLATE_CACHE_FOLDER'], pattern=f'__jinja2_{jinja2.__version__}_%s.cache')
+
+  fragment_cache.maxsize = app.config['FRAGMENT_CACHE_SIZE']
+  fragment_cache.ttl = app.config['FRAGMENT_CACHE_TTL']
+  record_cache.maxsize = app.config['RECORD_CACHE_SIZE']
+  record_cache.ttl = app.config['RECORD_CACHE_TTL']
+  for name_index in name_indexes.values():
+    name_index.ttl = app.config['AUTOCOMPLETE_REFRESH']
+    name_index.max_entries = app.config['AUTOCOMPLETE_MAX_ENTRIES']
+
+  if not app.debug:
+    applog.init_app(app)
+    app.logger.info('errors')
+  return app
+
 
 #----------------------------------------------------------------------------#
-# Models.
+# Filters.
 #----------------------------------------------------------------------------#
 
-# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
-class Venue(db.Model):
-  __tablename__ = 'Venue'
-
-  id = db.Column(db.Integer, primary_key=True)
-  name = db.Column(db.String, nullable=False)
-  city = db.Column(db.String(120), nullable=False)
-  state = db.Column(db.String(120), nullable=False)
-  address = db.Column(db.String(120), nullable=False)
-  phone = db.Column(db.String(120))
-  image_link = db.Column(db.String(500))
-  facebook_link = db.Column(db.String(120))
-
-  # TODO: implement any missing fields, as a database migration using Flask-Migrate
-  genres = db.Column(db.ARRAY(db.String(120)), nullable=False)
-  website = db.Column(db.String(120))
-  seeking_venue = db.Column(db.Boolean, default=False)
-  seeking_description = db.Column(db.String(500))
-
-  def __repr__(self):
-    return f'<Venue ID: {self.id}, name: {self.name}>'
-
-  def to_dict(self):
-    return {
-      "id": self.id,
-      "name": self.name,          
-      "city": self.city,         
-      "state": self.state, 
-      "address": self.address,            
-      "phone": self.phone,      
-      "genres": self.genres,                     
-      "image_link": self.image_link,
-      "facebook_link": self.facebook_link,     
-      "website": self.website,        
-      "seeking_venue": self.seeking_venue,
-      "seeking_description": self.seeking_description
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format):
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+@lru_cache(maxsize=None)
+def datetime_locale():
+  return babel.Locale.parse(babel.dates.LC_TIME)
+
+def format_datetime(value, format='medium'):
+  # views pass datetimes straight through, strings are still accepted
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  return datetime_pattern(format).apply(value, datetime_locale())
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def render_listing(template_name, **context):
+  '''
+  Renders a listing page. With STREAM_TEMPLATES enabled the template is
+  streamed to the client, so generators passed in the context are consumed
+  while the response is being sent instead of being built up front.
+  '''
+  if not current_app.config.get('STREAM_TEMPLATES'):
+    return render_template(template_name, **context)
+  current_app.update_template_context(context)
+  template = current_app.jinja_env.get_template(template_name)
+  return Response(stream_with_context(template.stream(context)))
+
+LIST_FIELDS = ('genres',)
+
+def form_to_dict(form):
+  '''
+  Submitted form fields as a dict. List fields (genres) always map to a list,
+  even when a single value was picked, the other fields to their value.
+  '''
+  return {key: values if key in LIST_FIELDS else values[0] for key, values in form.lists()}
+
+def parse_show_id(value):
+  # whole numbers only: int() would take 1.9 as 1 and True as 1
+  if isinstance(value, bool):
+    raise TypeError(value)
+  if isinstance(value, float) and not value.is_integer():
+    raise ValueError(value)
+  if isinstance(value, str) and not re.fullmatch(r'[0-9]+', value.strip()):
+    raise ValueError(value)
+  return int(value)
+
+def validate_show_rows(entries):
+  '''
+  Validates a batch of (number, (artist_id, venue_id, start_time)) entries in
+  one pass: values are parsed first, then the referenced artists and venues
+  and the shows already booked are looked up with one query each for the
+  whole batch. Start times are local times like everywhere else in the app,
+  ones with a UTC offset are refused rather than stored without it. Returns
+  the valid rows and (number, error) for the others.
+  '''
+  parsed, failures = [], []
+  for number, (artist_id, venue_id, start_time) in entries:
+    try:
+      if not isinstance(start_time, datetime.datetime):
+        start_time = dateutil.parser.parse(start_time)
+      row = {"artist_id": parse_show_id(artist_id), "venue_id": parse_show_id(venue_id), "start_time": start_time}
+    except (TypeError, ValueError, OverflowError):
+      failures.append((number, 'expected artist_id, venue_id, start_time'))
+      continue
+    if start_time.tzinfo is not None:
+      failures.append((number, 'start_time must be a local time, without a UTC offset'))
+      continue
+    parsed.append((number, row))
+  artist_ids = {row["artist_id"] for _, row in parsed}
+  venue_ids = {row["venue_id"] for _, row in parsed}
+  known_artists = {artist_id for (artist_id,) in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+  known_venues = {venue_id for (venue_id,) in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+  start_times = {row["start_time"] for _, row in parsed}
+  booked = set(db.session.query(Shows.artist_id, Shows.venue_id, Shows.start_time)
+               .filter(Shows.artist_id.in_(artist_ids), Shows.venue_id.in_(venue_ids),
+                       Shows.start_time.in_(start_times)))
+  rows = []
+  for number, row in parsed:
+    show = (row["artist_id"], row["venue_id"], row["start_time"])
+    if row["artist_id"] not in known_artists:
+      failures.append((number, f'no artist with ID {row["artist_id"]}'))
+    elif row["venue_id"] not in known_venues:
+      failures.append((number, f'no venue with ID {row["venue_id"]}'))
+    elif show in booked:
+      failures.append((number, f'artist {show[0]} already has this show at venue {show[1]}'))
+    else:
+      booked.add(show)
+      rows.append((number, row))
+  failures.sort()
+  return rows, failures
+
+def insert_shows(rows):
+  '''
+  Inserts validated (number, row) show rows with a single multi-row INSERT,
+  in the current transaction, and refreshes the show counters. Returns the
+  inserted rows and (number, error) for rows booked concurrently.
+  '''
+  if not rows:
+    return [], []
+  values = [row for _, row in rows]
+  if db.engine.dialect.name == 'postgresql':
+    insert = postgresql.insert(Shows.__table__).values(values).on_conflict_do_nothing() \
+      .returning(Shows.artist_id, Shows.venue_id, Shows.start_time)
+    created = {tuple(show) for show in db.session.execute(insert)}
+  else:
+    db.session.execute(Shows.__table__.insert().values(values))
+    created = {(row["artist_id"], row["venue_id"], row["start_time"]) for row in values}
+  inserted, failures = [], []
+  for number, row in rows:
+    if (row["artist_id"], row["venue_id"], row["start_time"]) in created:
+      inserted.append(row)
+    else:
+      failures.append((number, f'artist {row["artist_id"]} already has this show at venue {row["venue_id"]}'))
+  refresh_show_counters(venue_ids={row["venue_id"] for row in inserted},
+                        artist_ids={row["artist_id"] for row in inserted})
+  return inserted, failures
+
+def delete_records(model, ids):
+  '''
+  Deletes the venues or artists with the given ids, 1000 per statement, and
+  commits. Their shows are deleted by the database (ON DELETE CASCADE), so
+  nothing is loaded into the session; only the ids on the other side of those
+  shows are read first, to refresh their counters. Returns the number of
+  deleted records.
+  '''
+  ids = list(ids)
+  own_column, other_column, other_model, kind, other_kind = (
+    (Shows.venue_id, Shows.artist_id, Artist, 'venue', 'artist') if model is Venue
+    else (Shows.artist_id, Shows.venue_id, Venue, 'artist', 'venue'))
+  try:
+    other_ids = set()
+    deleted = 0
+    for start in range(0, len(ids), 1000):
+      chunk = ids[start:start + 1000]
+      other_ids.update(other_id for (other_id,) in
+                       db.session.query(other_column).filter(own_column.in_(chunk)).distinct())
+      deleted += db.session.execute(model.__table__.delete().where(model.id.in_(chunk))).rowcount
+    refresh_show_counters(**{f'{other_kind}_ids': other_ids})
+    db.session.commit()
+  except Exception:
+    db.session.rollback()
+    raise
+  finally:
+    db.session.close()
+  versions.bump(*[(kind, record_id) for record_id in ids], *[(other_kind, other_id) for other_id in other_ids])
+  name_indexes[kind].discard(ids)
+  return deleted
+
+def refresh_show_counters(venue_ids=(), artist_ids=()):
+  '''
+  Recomputes the upcoming/past show counters of the given venues and artists
+  from the Show table, in the current transaction. Archived shows count as
+  past shows.
+  '''
+  now = datetime.datetime.now()
+  for model, column, archived_column, ids in (
+      (Venue, Shows.venue_id, ShowArchive.venue_id, venue_ids),
+      (Artist, Shows.artist_id, ShowArchive.artist_id, artist_ids)):
+    ids = list(ids)
+    for start in range(0, len(ids), 1000):
+      shows = select([func.count()]).select_from(Shows.__table__).where(column == model.id)
+      archived = select([func.count()]).select_from(ShowArchive.__table__).where(archived_column == model.id)
+      db.session.query(model) \
+        .filter(model.id.in_(ids[start:start + 1000])) \
+        .update({
+          model.upcoming_shows_count: shows.where(Shows.start_time > now).as_scalar(),
+          model.past_shows_count: shows.where(Shows.start_time <= now).as_scalar() + archived.as_scalar(),
+        }, synchronize_session=False)
+
+ARCHIVE_SHOWS = db.text('''
+  WITH moved AS (
+    DELETE FROM "Show" WHERE start_time <= :cutoff
+    RETURNING artist_id, venue_id, start_time)
+  INSERT INTO "ShowArchive" (artist_id, venue_id, start_time)
+  SELECT artist_id, venue_id, start_time FROM moved
+  ON CONFLICT DO NOTHING''')
+
+def archive_shows(before, batch_size=5000):
+  '''
+  Moves the shows that started before `before` from Show to ShowArchive,
+  about `batch_size` shows per transaction, oldest first. The show counters
+  stay as they are: archived shows still count as past shows. Returns the
+  number of shows moved.
+  '''
+  moved = 0
+  while True:
+    # start time of the last show of the batch; shows starting at the same time go along
+    cutoff = db.session.query(Shows.start_time) \
+      .filter(Shows.start_time < before) \
+      .order_by(Shows.start_time) \
+      .offset(batch_size - 1).limit(1).scalar()
+    if cutoff is None:
+      cutoff = db.session.query(func.max(Shows.start_time)).filter(Shows.start_time < before).scalar()
+      if cutoff is None:
+        return moved
+    if db.engine.dialect.name == 'postgresql':
+      # one statement, so a show cannot be deleted without being archived
+      moved += db.session.execute(ARCHIVE_SHOWS, {"cutoff": cutoff}).rowcount
+    else:
+      old_shows = select([Shows.artist_id, Shows.venue_id, Shows.start_time]).where(Shows.start_time <= cutoff)
+      db.session.execute(ShowArchive.__table__.insert().from_select(
+        ['artist_id', 'venue_id', 'start_time'], old_shows))
+      moved += db.session.execute(Shows.__table__.delete().where(Shows.start_time <= cutoff)).rowcount
+    db.session.commit()
+
+def venue_areas(active_only=False):
+  '''
+  Yields venues grouped by area (state, city) with the number of upcoming
+  shows of every venue, read from the venue's own counter. Rows are streamed
+  in area order and grouped on the fly.
+  '''
+  rows = db.session.query(
+      Venue.state, Venue.city, Venue.id, Venue.name, Venue.upcoming_shows_count) \
+    .order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+  if active_only:
+    rows = rows.filter(Venue.upcoming_shows_count > 0)
+  for (state, city), venues in groupby(rows.yield_per(1000), key=lambda row: (row.state, row.city)):
+    yield {
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": venue.upcoming_shows_count,
+      } for venue in venues]
     }
 
+def search_by_name(model, term, limit):
+  '''
+  Case-insensitive partial match on the name of a Venue or Artist. Returns the
+  number of matches and the first `limit` of them from a single query, the
+  total being a window count over the whole match set.
+  '''
+  rows = db.session.query(model.id, model.name, func.count().over().label('total')) \
+    .filter(model.name.ilike(f'%{term}%')) \
+    .order_by(model.name, model.id) \
+    .limit(limit) \
+    .all()
+  return {
+    "count": rows[0].total if rows else 0,
+    "data": [{"id": row.id, "name": row.name} for row in rows]
+  }
+
+def load_names(model):
+  # beyond AUTOCOMPLETE_MAX_ENTRIES rows the prefix index gives up, one more
+  # row is enough to tell
+  def load():
+    return db.session.query(model.id, model.name) \
+      .limit(current_app.config['AUTOCOMPLETE_MAX_ENTRIES'] + 1) \
+      .all()
+  return load
+
+def count_names(model):
+  # counts no further than that one more row
+  def count():
+    return db.session.query(model.id) \
+      .limit(current_app.config['AUTOCOMPLETE_MAX_ENTRIES'] + 1) \
+      .count()
+  return count
+
+name_indexes = {
+  kind: PrefixIndex(load_names(model), count_names(model))
+  for kind, model in (('venue', Venue), ('artist', Artist))
+}
 
-class Artist(db.Model):
-  __tablename__ = 'Artist'
-
-  id = db.Column(db.Integer, primary_key=True)
-  name = db.Column(db.String, nullable=False)
-  city = db.Column(db.String(120), nullable=False)
-  state = db.Column(db.String(120), nullable=False)
-  phone = db.Column(db.String(120))
-  genres = db.Column(db.ARRAY(db.String(120)), nullable=False)
-  image_link = db.Column(db.String(500))
-  facebook_link = db.Column(db.String(120))
-  # TODO: implement any missing fields, as a database migration using Flask-Migrate
-  website = db.Column(db.String(120))
-  seeking_venue = db.Column(db.Boolean, default=False)
-  seeking_description = db.Column(db.String(500))
-  venues = db.relationship('Venue', 
-                            secondary='Show',
-                            backref=db.backref("artists"),
-                            cascade="all, delete",)
-
-  def __repr__(self):
-    return f'<Artist ID: {self.id}, name: {self.name}>'
-
-  def to_dict(self):
-    return {
-      "id": self.id,
-      "name": self.name,          
-      "city": self.city,         
-      "state": self.state,             
-      "phone": self.phone,      
-      "genres": self.genres,                     
-      "image_link": self.image_link,
-      "facebook_link": self.facebook_link,     
-      "website": self.website,        
-      "seeking_venue": self.seeking_venue,
-      "seeking_description": self.seeking_description
+def autocomplete(model, kind, prefix, limit):
+  '''
+  The first `limit` venues or artists whose name starts with `prefix`,
+  ignoring case. Served from the in-memory prefix index of this worker, or
+  from the name prefix index of the database when the table is too large to
+  be kept in memory.
+  '''
+  # the same prefix, and the same names, whichever of the two answers
+  prefix = normalize_prefix(prefix)
+  if not prefix:
+    return []
+  matches = name_indexes[kind].search(prefix, limit)
+  if matches is None:
+    pattern = re.sub(r'([\\%_])', r'\\\1', prefix) + '%'
+    name = func.lower(model.name)
+    if db.engine.dialect.name == 'postgresql':
+      # the collation of the ix_*_name_prefix_c indexes, which then return
+      # the matches already sorted
+      name = name.collate('C')
+    matches = db.session.query(model.id, model.name) \
+      .filter(name.like(pattern, escape='\\')) \
+      .order_by(name, model.id) \
+      .limit(limit) \
+      .all()
+  return [{"id": record_id, "name": name} for record_id, name in matches]
+
+def autocomplete_response(model, kind):
+  # ?q=<prefix>&limit=<n>, answered as {"data": [{"id", "name"}, ...]}
+  limit = min(request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int), 50)
+  return jsonify({"data": autocomplete(model, kind, request.args.get('q', ''), max(limit, 1))})
+
+def cached_record(model, kind, record_id):
+  '''
+  The to_dict() of the venue or artist with the given id, with its show
+  counters, or None when there is none. Records are cached per (kind, id,
+  bind, version stamp), so the handlers that change a record and bump its
+  stamp (edits, deletes, new shows) invalidate it in this worker; other
+  workers see the change after RECORD_CACHE_TTL seconds. Records read from
+  the replica are only served to replica reads (see routing.read_bind).
+  Returns a copy the caller may change.
+  '''
+  key = (kind, record_id, read_bind(), versions.get((kind, record_id)))
+  record = record_cache.get(key)
+  if record is None:
+    instance = model.query.get(record_id)
+    if instance is None:
+      return None
+    record = instance.to_dict()
+    record["upcoming_shows_count"] = instance.upcoming_shows_count
+    record["past_shows_count"] = instance.past_shows_count
+    record_cache.set(key, record)
+  return dict(record, genres=list(record["genres"]))
+
+def cached_fragment(kind, entity_id, template_name, load, **options):
+  '''
+  Returns the rendered detail fragment of a venue or artist with its ETag.
+  Fragments are cached per (kind, id, bind, version stamp, options): handlers
+  that change an entity bump its stamp, and entries expire after
+  FRAGMENT_CACHE_TTL seconds so shows still move from upcoming to past as
+  time goes by. Fragments rendered from the replica are only served to
+  replica reads. Options are passed on to `load`.
+  '''
+  key = (kind, entity_id, read_bind(), versions.get((kind, entity_id)), tuple(sorted(options.items())))
+  fragment = fragment_cache.get(key)
+  if fragment is None:
+    data = load(entity_id, **options)
+    html = render_template(template_name, **{kind: data})
+    fragment = {
+      "name": data["name"],
+      "html": html,
+      "etag": f'{kind}-{entity_id}-' + hashlib.sha1(html.encode()).hexdigest()[:20],
     }
+    fragment_cache.set(key, fragment)
+  return fragment
 
+def page_version(app, manifest=None):
+  '''
+  Digest of the templates and of the assets manifest, i.e. of everything a
+  page is rendered from besides its data.
+  '''
+  digest = hashlib.sha1(json.dumps(manifest, sort_keys=True).encode())
+  for name in sorted(app.jinja_env.list_templates()):
+    source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+    digest.update(name.encode() + b'\0' + source.encode())
+  return digest.hexdigest()[:12]
 
-class Shows(db.Model):
-  __tablename__ = 'Show'
+def fragment_page(template_name, fragment):
+  '''
+  Renders a page around a cached fragment, answering If-None-Match with 304.
+  The ETag also carries PAGE_VERSION, so the pages clients hold are rendered
+  again after a deploy changing the templates or the asset names. Pages
+  carrying flashed messages are rendered in full and get no ETag.
+  '''
+  if session.get('_flashes'):
+    return render_template(template_name, fragment=Markup(fragment["html"]), name=fragment["name"])
+  etag = f'{fragment["etag"]}-{current_app.config["PAGE_VERSION"]}'
+  if request.if_none_match.contains(etag):
+    response = Response(status=304)
+  else:
+    response = make_response(
+      render_template(template_name, fragment=Markup(fragment["html"]), name=fragment["name"]))
+  response.set_etag(etag)
+  response.headers['Cache-Control'] = 'no-cache'
+  return response
 
-  artist_id = db.Column(
-    db.Integer, 
-    db.ForeignKey('Artist.id'), 
-    primary_key=True)
-  venue_id = db.Column(
-    db.Integer, 
-    db.ForeignKey('Venue.id', ondelete="CASCADE"), 
-    primary_key=True)
-  start_time = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-  artist = db.relationship(Artist, backref="shows")
-  venue = db.relationship(Venue, backref="shows", cascade="all, delete")
+SEARCH_CONNECTIVES = {'a', 'an', 'and', 'at', 'in', 'near', 'of', 'or', 'the'}
 
-db.create_all()
+def split_search_terms(text):
+  '''
+  Splits a free text search such as "jazz in San Francisco" into the genres it
+  mentions and the remaining words, which are matched against names and places.
+  '''
+  genres = []
+  for genre in sorted(GENRES, key=len, reverse=True):
+    pattern = r'(?<!\w)' + re.escape(genre) + r'(?!\w)'
+    if re.search(pattern, text, re.IGNORECASE):
+      genres.append(genre)
+      text = re.sub(pattern, ' ', text, flags=re.IGNORECASE)
+  words = [word for word in text.split() if word.lower() not in SEARCH_CONNECTIVES]
+  return genres, ' '.join(words)
 
-#----------------------------------------------------------------------------#
-# Filters.
-#----------------------------------------------------------------------------#
+def search_document(model):
+  # must match the expression of the ix_<model>_search indexes
+  return func.to_tsvector('english', model.name + ' ' + model.city + ' ' + model.state)
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+def search_everything(text, page, per_page):
+  '''
+  Ranked search over venues and artists at once. Words are matched against the
+  full text index on name, city and state, genres through the genre link
+  tables. Returns the total number of matches and the requested page.
+  '''
+  genres, words = split_search_terms(text)
+  if not genres and not words:
+    return {"count": 0, "data": []}
+  selects = []
+  for kind, model in (('venue', Venue), ('artist', Artist)):
+    conditions = []
+    rank = literal(0.0)
+    if words:
+      query = func.plainto_tsquery('english', words)
+      conditions.append(search_document(model).op('@@')(query))
+      rank = func.ts_rank(search_document(model), query)
+    if genres:
+      conditions.append(model.genre_records.any(Genre.name.in_(genres)))
+    selects.append(
+      select([literal(kind).label('kind'), model.id, model.name,
+              model.city, model.state, rank.label('rank')])
+      .where(and_(*conditions)))
+  results = union_all(*selects).alias('results')
+  rows = db.session.query(results, func.count().over().label('total')) \
+    .order_by(results.c.rank.desc(), results.c.name, results.c.id) \
+    .limit(per_page) \
+    .offset((page - 1) * per_page) \
+    .all()
+  return {
+    "count": rows[0].total if rows else 0,
+    "data": [{
+      "kind": row.kind,
+      "id": row.id,
+      "name": row.name,
+      "city": row.city,
+      "state": row.state,
+    } for row in rows]
+  }
+
+def browse_conditions(model, genre=None, city=None, state=None):
+  conditions = []
+  if genre:
+    conditions.append(model.genre_records.any(Genre.name == genre))
+  if city:
+    conditions.append(model.city == city)
+  if state:
+    conditions.append(model.state == state)
+  return conditions
+
+# facets of facet_counts(): the GROUPING SET of each, over (genre, state, city),
+# and the grouping() bitmask of its rows, a set bit meaning not grouped on
+FACETS = (
+  ('genres', ('genre',), 0b011),
+  ('cities', ('state', 'city'), 0b100),
+  ('states', ('state',), 0b101),
+  ('total', (), 0b111),
+)
+
+def facet_counts(model, conditions):
+  '''
+  Counts the venues or artists matching `conditions` per genre, per city and
+  per state, plus their total, in one GROUPING SETS query (UNION ALL of the
+  same groupings on databases without GROUPING SETS, such as SQLite).
+  '''
+  columns = {"genre": Genre.name, "state": model.state, "city": model.city}
+  count = func.count(model.id.distinct()).label('count')
+
+  def query(*selected):
+    return db.session.query(*selected).select_from(model) \
+      .outerjoin(model.genre_records) \
+      .filter(*conditions)
+
+  if db.session.get_bind().dialect.name == 'postgresql':
+    rows = query(*[column.label(name) for name, column in columns.items()],
+                 func.grouping(*columns.values()).label('grouping'), count) \
+      .group_by(func.grouping_sets(*[tuple_(*[columns[name] for name in grouping_set])
+                                     for _, grouping_set, _ in FACETS])) \
+      .all()
+  else:
+    groupings = [
+      query(*[(column if name in grouping_set else literal(None)).label(name)
+              for name, column in columns.items()],
+            literal(mask).label('grouping'), count)
+      .group_by(*[columns[name] for name in grouping_set])
+      for _, grouping_set, mask in FACETS]
+    rows = groupings[0].union_all(*groupings[1:]).all()
+
+  facets = {facet: [] for facet, _, _ in FACETS}
+  facets["total"] = 0
+  by_mask = {mask: (facet, grouping_set) for facet, grouping_set, mask in FACETS}
+  for row in rows:
+    facet, grouping_set = by_mask[row.grouping]
+    if facet == "total":
+      facets["total"] = row.count
+    # venues or artists without any genre make a NULL genre row, left out
+    elif facet != "genres" or row.genre is not None:
+      facets[facet].append(dict({name: getattr(row, name) for name in grouping_set}, count=row.count))
+  for facet, grouping_set, _ in FACETS[:-1]:
+    facets[facet].sort(key=lambda value: (-value["count"], *[value[name] for name in grouping_set]))
+  return facets
 
-app.jinja_env.filters['datetime'] = format_datetime
+def browse(model, page, per_page, **filters):
+  '''
+  A page of the venues or artists matching the genre, city and state filters,
+  with the facet counts of all of them.
+  '''
+  conditions = browse_conditions(model, **filters)
+  facets = facet_counts(model, conditions)
+  rows = db.session.query(model.id, model.name, model.city, model.state) \
+    .filter(*conditions) \
+    .order_by(model.name, model.id) \
+    .limit(per_page) \
+    .offset((page - 1) * per_page) \
+    .all()
+  return {
+    "count": facets["total"],
+    "facets": facets,
+    "data": [{"id": row.id, "name": row.name, "city": row.city, "state": row.state} for row in rows]
+  }
+
+def browse_page(model, kind):
+  # ?genre=&city=&state= filters, ?page= for the following results
+  filters = {key: request.args[key] for key in ('genre', 'city', 'state') if request.args.get(key)}
+  page = max(request.args.get('page', 1, type=int), 1)
+  per_page = current_app.config['SEARCH_RESULTS_LIMIT']
+  results = browse(model, page, per_page, **filters)
+  return render_template('pages/browse.html', kind=kind, results=results, filters=filters,
+                         page=page, has_next=page * per_page < results["count"])
+
+def encode_show_cursor(show):
+  return f'{show.start_time.isoformat()}|{show.artist_id}|{show.venue_id}'
+
+def decode_show_cursor(cursor):
+  try:
+    start_time, artist_id, venue_id = cursor.split('|')
+    return datetime.datetime.fromisoformat(start_time), int(artist_id), int(venue_id)
+  except ValueError:
+    abort(400)
+
+def parse_datetime_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.datetime.fromisoformat(value)
+  except ValueError:
+    abort(400)
+
+def parse_id_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  if not re.fullmatch(r'[0-9]+', value):
+    abort(400)
+  return int(value)
+
+def shows_page(after=None, per_page=30, start=None, end=None, venue_id=None, artist_id=None):
+  '''
+  Returns a page of shows ordered by (start_time, artist_id, venue_id) and the
+  cursor of the next page, or None on the last page. Pages are found by seeking
+  past the cursor in that order instead of using an offset, and each page comes
+  from one query joining the venue and artist. Every page costs the same
+  however large the Show table grows as long as the seek is an index range
+  scan: this relies on ix_Show_start_time (start_time, artist_id, venue_id),
+  added by migration e5a90d3b6f21. Without it each page scans and sorts Show.
+
+  Shows can be limited to start times in [start, end) and to one venue or
+  artist; the (venue_id, start_time), (artist_id, start_time) and start_time
+  indexes turn these filters into index range scans.
+  '''
+  query = db.session.query(
+      Shows.start_time, Shows.venue_id, Venue.name.label('venue_name'),
+      Shows.artist_id, Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')) \
+    .join(Venue, Shows.venue_id == Venue.id) \
+    .join(Artist, Shows.artist_id == Artist.id) \
+    .order_by(Shows.start_time, Shows.artist_id, Shows.venue_id)
+  if start is not None:
+    query = query.filter(Shows.start_time >= start)
+  if end is not None:
+    query = query.filter(Shows.start_time < end)
+  if venue_id is not None:
+    query = query.filter(Shows.venue_id == venue_id)
+  if artist_id is not None:
+    query = query.filter(Shows.artist_id == artist_id)
+  if after is not None:
+    query = query.filter(tuple_(Shows.start_time, Shows.artist_id, Shows.venue_id) > tuple_(*after))
+  rows = query.limit(per_page + 1).all()
+  next_cursor = encode_show_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+  return rows[:per_page], next_cursor
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@main.route('/')
 def index():
   return render_template('pages/home.html')
 
 
+@main.route('/search')
+@read_only
+def search():
+  # searches venues and artists by name, city, state and genre
+  search_term = request.args.get('q', '')
+  page = max(request.args.get('page', 1, type=int), 1)
+  per_page = current_app.config['SEARCH_RESULTS_LIMIT']
+  response = search_everything(search_term, page, per_page)
+  return render_template('pages/search.html', results=response, search_term=search_term,
+                         page=page, has_next=page * per_page < response["count"])
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@read_only
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  STATE, CITY, NAME, ID = 0, 1, 2, 3
-  venues = db.session.query(Venue.state, Venue.city, Venue.name, Venue.id).all()
-  raw_data = {}
-  for v in venues:
-    if raw_data.get(v[STATE]) is None:
-      raw_data[v[STATE]] = {}
-    if raw_data[v[STATE]].get(v[CITY]) is None:
-      raw_data[v[STATE]][v[CITY]] = []
-    raw_data[v[STATE]][v[CITY]].append({
-      "name": v[NAME],
-      "id": v[ID],
-    })
-  data = []
-  for state in raw_data:
-    for city in raw_data[state]:
-      data.append({
-        "city": city,
-        "state": state,
-        "venues": raw_data[state][city]
-      })
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+  # ?active=1 lists only venues with upcoming shows
+  active_only = request.args.get('active', 0, type=int) == 1
+  return render_listing('pages/venues.html', areas=venue_areas(active_only))
+
+@main.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  name = request.form.get('search_term', '')
-  venues = Venue.query.filter(Venue.name.ilike(f'%{name}%'))
-  response={
-    "count": venues.count(),
-    "data": []
-  }
-  for venue in venues:
-    response["data"].append({
-      "id": venue.id,
-      "name": venue.name
-    })
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  response = search_by_name(Venue, search_term, current_app.config['SEARCH_RESULTS_LIMIT'])
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  shows = Shows.query.filter_by(venue_id=venue_id)
-  data = Venue.query.get(venue_id).to_dict()
+@main.route('/venues/autocomplete')
+@read_only
+def autocomplete_venues():
+  return autocomplete_response(Venue, 'venue')
+
+@main.route('/venues/browse')
+@read_only
+def browse_venues():
+  return browse_page(Venue, 'venue')
+
+def venue_details(venue_id, history=False):
+  data = cached_record(Venue, 'venue', venue_id)
+  if data is None:
+    abort(404)
   data["upcoming_shows"] = []
   data["past_shows"] = []
-  timenow = datetime.datetime.now()
+  # artists are joined in and shows are split by start time in the same query
+  shows = db.session.query(
+      Artist.id, Artist.name, Artist.image_link, Shows.start_time,
+      (Shows.start_time > datetime.datetime.now()).label('upcoming')) \
+    .select_from(Shows) \
+    .join(Artist, Shows.artist_id == Artist.id) \
+    .filter(Shows.venue_id == venue_id) \
+    .order_by(Shows.start_time)
   for show in shows:
-    key = ""
-    if show.start_time > timenow:
-      key = "upcoming_shows"
-    else:
-      key = "past_shows"
-    data[key].append({
-      "artist_id": show.artist.id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
+    data["upcoming_shows" if show.upcoming else "past_shows"].append({
+      "artist_id": show.id,
+      "artist_name": show.name,
+      "artist_image_link": show.image_link,
+      "start_time": show.start_time
     })
   data["past_shows_count"] = len(data["past_shows"])
   data["upcoming_shows_count"] = len(data["upcoming_shows"])
-  return render_template('pages/show_venue.html', venue=data)
+  # shows in ShowArchive are only counted, and read when the history is expanded
+  data["archived_shows"] = []
+  if not history:
+    data["archived_shows_count"] = db.session.query(func.count()).select_from(ShowArchive) \
+      .filter(ShowArchive.venue_id == venue_id).scalar()
+  else:
+    archived = db.session.query(
+        Artist.id, Artist.name, Artist.image_link, ShowArchive.start_time) \
+      .select_from(ShowArchive) \
+      .join(Artist, ShowArchive.artist_id == Artist.id) \
+      .filter(ShowArchive.venue_id == venue_id) \
+      .order_by(ShowArchive.start_time)
+    data["archived_shows"] = [{
+      "artist_id": show.id,
+      "artist_name": show.name,
+      "artist_image_link": show.image_link,
+      "start_time": show.start_time
+    } for show in archived]
+    data["archived_shows_count"] = len(data["archived_shows"])
+  return data
+
+@main.route('/venues/<int:venue_id>')
+@read_only
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id, ?history=1 adds the archived shows
+  fragment = cached_fragment('venue', venue_id, 'fragments/venue.html', venue_details,
+                             history=request.args.get('history') == '1')
+  return fragment_page('pages/show_venue.html', fragment)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   # TODO: insert form data as a new Venue record in the db, instead
   # TODO: modify data to be the data object returned from db insertion
-  data = dict((key, 
-              request.form.getlist(key) if len(request.form.getlist(key)) > 1 
-              else request.form.getlist(key)[0]) for key in request.form.keys())
+  data = form_to_dict(request.form)
   try:
     data['seeking_venue'] = True if data.get('seeking_venue') == 'y' else False
     venue = Venue(**data)
     db.session.add(venue)
     db.session.commit()
+    name_indexes['venue'].set(venue.id, venue.name)
     flash('Venue ' + data['name'] + ' was successfully listed!')
-  except Exception as e:
-    print(e)
+  except Exception:
+    current_app.logger.exception('Could not create venue')
     db.session.rollback()
     # TODO: on unsuccessful db insert, flash an error instead.
     # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
@@ -250,7 +821,7 @@ def create_venue_submission():
     db.session.close()
   return render_template('pages/home.html')
 
-@app.route('/venues/<int:venue_id>', methods=['DELETE'])
+@main.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   # TODO: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
@@ -258,91 +829,117 @@ def delete_venue(venue_id):
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
   try:
-    Venue.query.filter_by(id=venue_id).delete()
-    db.session.commit()
-  except Exception as e:
-    print(e)
-    db.session.rollback()
-  finally:
-    db.session.close()
-  return redirect(url_for('index'), code=307)
+    delete_records(Venue, [venue_id])
+  except Exception:
+    current_app.logger.exception('Could not delete venue %s', venue_id)
+  return redirect(url_for('main.index'), code=307)
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@read_only
 def artists():
-  # TODO: replace with real data returned from querying the database
-  NAME, ID = 0, 1
-  artists = db.session.query(Artist.name, Artist.id).all()
-  data = []
-  for v in artists:
-    data.append({
-      "name": v[NAME],
-      "id": v[ID],
-    })
+  # ?active=1 lists only artists with upcoming shows, ?sort=upcoming the busiest first
+  artists = db.session.query(Artist.name, Artist.id, Artist.upcoming_shows_count)
+  if request.args.get('active', 0, type=int) == 1:
+    artists = artists.filter(Artist.upcoming_shows_count > 0)
+  if request.args.get('sort') == 'upcoming':
+    artists = artists.order_by(Artist.upcoming_shows_count.desc(), Artist.name)
+  data = [{
+    "name": artist.name,
+    "id": artist.id,
+    "num_upcoming_shows": artist.upcoming_shows_count,
+  } for artist in artists]
 
   return render_template('pages/artists.html', artists=data)
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  name = request.form.get('search_term', '')
-  artists = Artist.query.filter(Artist.name.ilike(f'%{name}%'))
-  response={
-    "count": artists.count(),
-    "data": []
-  }
-  for artist in artists:
-    response["data"].append({
-      "id": artist.id,
-      "name": artist.name
-    })
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  response = search_by_name(Artist, search_term, current_app.config['SEARCH_RESULTS_LIMIT'])
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  shows = Shows.query.filter_by(artist_id=artist_id)
-  data = Artist.query.get(artist_id).to_dict()
+@main.route('/artists/autocomplete')
+@read_only
+def autocomplete_artists():
+  return autocomplete_response(Artist, 'artist')
+
+@main.route('/artists/browse')
+@read_only
+def browse_artists():
+  return browse_page(Artist, 'artist')
+
+def artist_details(artist_id, history=False):
+  data = cached_record(Artist, 'artist', artist_id)
+  if data is None:
+    abort(404)
   data["upcoming_shows"] = []
   data["past_shows"] = []
-  timenow = datetime.datetime.now()
+  # venues are joined in and shows are split by start time in the same query
+  shows = db.session.query(
+      Venue.id, Venue.name, Venue.image_link, Shows.start_time,
+      (Shows.start_time > datetime.datetime.now()).label('upcoming')) \
+    .select_from(Shows) \
+    .join(Venue, Shows.venue_id == Venue.id) \
+    .filter(Shows.artist_id == artist_id) \
+    .order_by(Shows.start_time)
   for show in shows:
-    key = ""
-    if show.start_time > timenow:
-      key = "upcoming_shows"
-    else:
-      key = "past_shows"
-    data[key].append({
-      "venue_id": show.venue.id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": str(show.start_time)
+    data["upcoming_shows" if show.upcoming else "past_shows"].append({
+      "venue_id": show.id,
+      "venue_name": show.name,
+      "venue_image_link": show.image_link,
+      "start_time": show.start_time
     })
   data["past_shows_count"] = len(data["past_shows"])
   data["upcoming_shows_count"] = len(data["upcoming_shows"])
-  return render_template('pages/show_artist.html', artist=data)
+  # shows in ShowArchive are only counted, and read when the history is expanded
+  data["archived_shows"] = []
+  if not history:
+    data["archived_shows_count"] = db.session.query(func.count()).select_from(ShowArchive) \
+      .filter(ShowArchive.artist_id == artist_id).scalar()
+  else:
+    archived = db.session.query(
+        Venue.id, Venue.name, Venue.image_link, ShowArchive.start_time) \
+      .select_from(ShowArchive) \
+      .join(Venue, ShowArchive.venue_id == Venue.id) \
+      .filter(ShowArchive.artist_id == artist_id) \
+      .order_by(ShowArchive.start_time)
+    data["archived_shows"] = [{
+      "venue_id": show.id,
+      "venue_name": show.name,
+      "venue_image_link": show.image_link,
+      "start_time": show.start_time
+    } for show in archived]
+    data["archived_shows_count"] = len(data["archived_shows"])
+  return data
+
+@main.route('/artists/<int:artist_id>')
+@read_only
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id, ?history=1 adds the archived shows
+  fragment = cached_fragment('artist', artist_id, 'fragments/artist.html', artist_details,
+                             history=request.args.get('history') == '1')
+  return fragment_page('pages/show_artist.html', fragment)
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
   # TODO: populate form with fields from artist with ID <artist_id>
-  artist = Artist.query.get(artist_id)
+  artist = cached_record(Artist, 'artist', artist_id)
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   # TODO: take values from the form submitted, and update existing
   # artist record with ID <artist_id> using the new attributes
-  to_update = dict((key, 
-              request.form.getlist(key) if len(request.form.getlist(key)) > 1 
-              else request.form.getlist(key)[0]) for key in request.form.keys())
-  to_update['seeking_venue'] = True if data.get('seeking_venue') == 'y' else False
+  to_update = form_to_dict(request.form)
+  to_update['seeking_venue'] = True if to_update.get('seeking_venue') == 'y' else False
   artist = Artist.query.get(artist_id)
   try:
     artist.name = to_update.get("name")
@@ -356,30 +953,32 @@ def edit_artist_submission(artist_id):
     artist.seeking_talent = to_update.get("seeking_talent")
     artist.seeking_description = to_update.get("seeking_description")
     artist.image_link = to_update.get("image_link")
+    venue_ids = [venue_id for (venue_id,) in
+                 db.session.query(Shows.venue_id).filter_by(artist_id=artist_id)]
     db.session.commit()
-  except Exception as e:
-    print(e)
+    versions.bump(('artist', artist_id), *[('venue', venue_id) for venue_id in venue_ids])
+    name_indexes['artist'].set(artist_id, to_update.get("name"))
+  except Exception:
+    current_app.logger.exception('Could not update artist %s', artist_id)
     db.session.rollback()
   finally:
     db.session.close()
-  return redirect(url_for('show_artist', artist_id=artist_id))
+  return redirect(url_for('main.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   form = VenueForm()
   # TODO: populate form with values from venue with ID <venue_id>
-  venue = Venue.query.get(venue_id)
+  venue = cached_record(Venue, 'venue', venue_id)
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
   venue = Venue.query.get(venue_id)
-  to_update = dict((key, 
-            request.form.getlist(key) if len(request.form.getlist(key)) > 1 
-            else request.form.getlist(key)[0]) for key in request.form.keys())
-  to_update['seeking_venue'] = True if data.get('seeking_venue') == 'y' else False
+  to_update = form_to_dict(request.form)
+  to_update['seeking_venue'] = True if to_update.get('seeking_venue') == 'y' else False
   try:
     venue.name = to_update.get("name")
     venue.city = to_update.get("city")
@@ -391,37 +990,40 @@ def edit_venue_submission(venue_id):
     venue.seeking_talent = to_update.get("seeking_talent")
     venue.seeking_description = to_update.get("seeking_description")
     venue.image_link = to_update.get("image_link")
+    artist_ids = [artist_id for (artist_id,) in
+                  db.session.query(Shows.artist_id).filter_by(venue_id=venue_id)]
     db.session.commit()
-  except Exception as e:
-    print(e)
+    versions.bump(('venue', venue_id), *[('artist', artist_id) for artist_id in artist_ids])
+    name_indexes['venue'].set(venue_id, to_update.get("name"))
+  except Exception:
+    current_app.logger.exception('Could not update venue %s', venue_id)
     db.session.rollback()
   finally:
     db.session.close()
-  return redirect(url_for('show_venue', venue_id=venue_id))
+  return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # TODO: insert form data as a new Artist record in the db, instead
   # TODO: modify data to be the data object returned from db insertion
-  data = dict((key, 
-              request.form.getlist(key) if len(request.form.getlist(key)) > 1 
-              else request.form.getlist(key)[0]) for key in request.form.keys())
+  data = form_to_dict(request.form)
   try:
     data['seeking_venue'] = True if data.get('seeking_venue') == 'y' else False
     venue = Artist(**data)
     db.session.add(venue)
     db.session.commit()
+    name_indexes['artist'].set(venue.id, venue.name)
     flash('Artist ' + data['name'] + ' was successfully listed!')
-  except Exception as e:
-    print(e)
+  except Exception:
+    current_app.logger.exception('Could not create artist')
     db.session.rollback()
     # TODO: on unsuccessful db insert, flash an error instead.
     # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
@@ -435,44 +1037,62 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@read_only
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  all_shows = Shows.query.all()
-  data = []
-  for show in all_shows:
-    data.append({
-      "venue_id": show.venue.id,
-      "venue_name": show.venue.name,
-      "artist_id": show.artist.id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
+  # displays list of shows at /shows, one page at a time. Shows can be
+  # filtered with ?from=&to= (ISO 8601 start times) and ?venue_id=&artist_id=;
+  # clients asking for application/json get the page as JSON.
+  after = request.args.get('after')
+  filters = {
+    key: request.args[key] for key in ('from', 'to', 'venue_id', 'artist_id')
+    if request.args.get(key)
+  }
+  rows, next_cursor = shows_page(
+    after=decode_show_cursor(after) if after else None,
+    per_page=current_app.config['SHOWS_PER_PAGE'],
+    start=parse_datetime_arg('from'),
+    end=parse_datetime_arg('to'),
+    venue_id=parse_id_arg('venue_id'),
+    artist_id=parse_id_arg('artist_id'))
+  data = [{
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_name,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link,
+    "start_time": show.start_time
+  } for show in rows]
+  if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+    for show in data:
+      show["start_time"] = show["start_time"].isoformat()
+    return jsonify({
+      "shows": data,
+      "next": url_for('main.shows', after=next_cursor, **filters) if next_cursor else None
     })
-  return render_template('pages/shows.html', shows=data)
+  return render_listing('pages/shows.html', shows=data, next_cursor=next_cursor, filters=filters)
 
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   # TODO: insert form data as a new Show record in the db, instead
-  data = dict((key, 
-              request.form.getlist(key) if len(request.form.getlist(key)) > 1 
-              else request.form.getlist(key)[0]) for key in request.form.keys())
+  data = form_to_dict(request.form)
   try:
     show = Shows(**data)
     db.session.add(show)
+    db.session.flush()
+    refresh_show_counters(venue_ids=[int(data['venue_id'])], artist_ids=[int(data['artist_id'])])
     db.session.commit()
+    versions.bump(('venue', int(data['venue_id'])), ('artist', int(data['artist_id'])))
     flash('Show was successfully listed!')
-  except Exception as e:
-    print(e)
+  except Exception:
+    current_app.logger.exception('Could not create show')
     db.session.rollback()
     # TODO: on unsuccessful db insert, flash an error instead.
     # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
@@ -485,29 +1105,217 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+@main.route('/shows/create/batch')
+def create_shows_batch():
+  form = ShowBatchForm()
+  return render_template('forms/new_shows.html', form=form, failures=[])
+
+@main.route('/shows/create/batch', methods=['POST'])
+def create_shows_batch_submission():
+  '''
+  Lists many shows at once, e.g. a whole tour. Takes a JSON body
+  {"shows": [{"artist_id", "venue_id", "start_time"}, ...]} or the form's
+  textarea with one "artist_id, venue_id, start_time" line per show. Valid
+  shows are inserted in one transaction, invalid ones reported by row.
+  '''
+  if request.is_json:
+    shows = (request.get_json(silent=True) or {}).get('shows')
+    if not isinstance(shows, list):
+      abort(400)
+    entries = [(number, (show.get('artist_id'), show.get('venue_id'), show.get('start_time'))
+                if isinstance(show, dict) else (None, None, None))
+               for number, show in enumerate(shows, 1)]
+  else:
+    lines = request.form.get('shows', '').splitlines()
+    entries = [(number, (line.split(',', 2) + [None, None])[:3])
+               for number, line in enumerate(lines, 1) if line.strip()]
+  if len(entries) > current_app.config['SHOW_BATCH_LIMIT']:
+    abort(413)
+  rows, failures = validate_show_rows(entries)
+  inserted = []
+  try:
+    inserted, conflicts = insert_shows(rows)
+    db.session.commit()
+    failures = sorted(failures + conflicts)
+    versions.bump(*{('venue', row["venue_id"]) for row in inserted},
+                  *{('artist', row["artist_id"]) for row in inserted})
+  except Exception:
+    current_app.logger.exception('Could not create a batch of %s shows', len(rows))
+    db.session.rollback()
+    inserted = []
+    failures = sorted(failures + [(number, 'could not be listed') for number, _ in rows])
+  finally:
+    db.session.close()
+
+  if request.is_json:
+    return jsonify({
+      "created": len(inserted),
+      "failures": [{"row": number, "error": error} for number, error in failures],
+    })
+  flash(f'{len(inserted)} shows were successfully listed, {len(failures)} rejected.')
+  # keep the rejected lines in the form so they can be fixed and sent again
+  rejected = {number for number, _ in failures}
+  form = ShowBatchForm(formdata=None, shows='\n'.join(lines[number - 1] for number in sorted(rejected)))
+  return render_template('forms/new_shows.html', form=form, failures=failures)
+
+@main.route('/_metrics')
+def metrics():
+  '''Connection pool gauges and cache counters of this worker, as JSON.'''
+  engines = {'primary': db.engine}
+  if replica_configured(current_app):
+    engines[REPLICA] = db.get_engine(bind=REPLICA)
+  status = dbpool.pool_status(engines)
+  status["caches"] = {"records": record_cache.stats(), "fragments": fragment_cache.stats()}
+  return jsonify(status)
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+def genre_ids(connection, names):
+  '''Ids of the named genres, adding the ones Genre does not have yet.'''
+  genres = Genre.__table__
+  query = select([genres.c.name, genres.c.id])
+  ids = dict(connection.execute(query.where(genres.c.name.in_(names))).fetchall())
+  missing = set(names) - ids.keys()
+  if missing:
+    connection.execute(genres.insert(), [{"name": name} for name in missing])
+    ids.update(connection.execute(query.where(genres.c.name.in_(missing))).fetchall())
+  return ids
+
+IMPORTABLE = {
+  'venues': (Venue, VenueForm, [bulk_import.Link('genres', venue_genres, 'venue_id', 'genre_id', genre_ids)]),
+  'artists': (Artist, ArtistForm, [bulk_import.Link('genres', artist_genres, 'artist_id', 'genre_id', genre_ids)]),
+  'shows': (Shows, ShowForm, []),
+}
+
+@main.cli.command('import-data')
+@click.argument('entity', type=click.Choice(list(IMPORTABLE)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per transaction.')
+def import_data(entity, path, batch_size):
+  '''Bulk loads venues, artists or shows from a CSV or JSON lines file.'''
+  model, form_class, links = IMPORTABLE[entity]
+  inserted, failures = bulk_import.import_rows(
+    db.engine, model.__table__, form_class, bulk_import.read_rows(path),
+    batch_size=batch_size, report=click.echo, links=links)
+  for line, error in failures[:50]:
+    click.echo(f'row {line}: {error}', err=True)
+  if len(failures) > 50:
+    click.echo(f'... and {len(failures) - 50} more rejected rows', err=True)
+  click.echo(f'Imported {inserted} {entity}, rejected {len(failures)}.')
+  if entity == 'shows':
+    refresh_all_show_counters()
+    click.echo('Refreshed show counters.')
+
+@main.cli.command('generate-data')
+@click.option('--venues', 'venue_count', default=1000, show_default=True)
+@click.option('--artists', 'artist_count', default=2000, show_default=True)
+@click.option('--shows', 'show_count', default=20000, show_default=True)
+@click.option('--seed', default=0, show_default=True, help='The same seed generates the same data.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per transaction.')
+def generate_data(venue_count, artist_count, show_count, seed, batch_size):
+  '''Adds skewed synthetic venues, artists and shows, see synthetic.py.'''
+  tables = {entity: (model.__table__, links) for entity, (model, _, links) in IMPORTABLE.items()}
+  try:
+    synthetic.generate(db.engine, tables, venue_count, artist_count, show_count,
+                       seed=seed, batch_size=batch_size, report=click.echo)
+  except ValueError as e:
+    raise click.BadParameter(str(e), param_hint='--shows')
+  refresh_all_show_counters()
+  click.echo('Refreshed show counters.')
+
+@main.cli.command('delete-data')
+@click.argument('entity', type=click.Choice(['venues', 'artists']))
+@click.argument('ids', nargs=-1, type=int)
+@click.option('--from-file', type=click.File(), help='File with one ID per line.')
+def delete_data(entity, ids, from_file):
+  '''Deletes venues or artists, with all their shows, by ID.'''
+  ids = list(ids)
+  if from_file is not None:
+    ids.extend(int(line) for line in from_file if line.strip())
+  model = IMPORTABLE[entity][0]
+  deleted = delete_records(model, ids)
+  click.echo(f'Deleted {deleted} {entity}.')
+
+def refresh_all_show_counters():
+  venue_ids = [venue_id for (venue_id,) in db.session.query(Venue.id)]
+  artist_ids = [artist_id for (artist_id,) in db.session.query(Artist.id)]
+  refresh_show_counters(venue_ids=venue_ids, artist_ids=artist_ids)
+  db.session.commit()
+
+@main.cli.command('roll-forward-shows')
+@click.option('--window', default=60, show_default=True,
+              help='Minutes to look back. Schedule the command at least this often.')
+@click.option('--all', 'everything', is_flag=True,
+              help='Recompute the counters of every venue and artist.')
+def roll_forward_shows(window, everything):
+  '''Moves shows that have started from the upcoming to the past counters.'''
+  if everything:
+    refresh_all_show_counters()
+    click.echo('Refreshed the show counters of every venue and artist.')
+    return
+  now = datetime.datetime.now()
+  started = db.session.query(Shows.venue_id, Shows.artist_id) \
+    .filter(Shows.start_time > now - datetime.timedelta(minutes=window), Shows.start_time <= now) \
+    .all()
+  venue_ids = {show.venue_id for show in started}
+  artist_ids = {show.artist_id for show in started}
+  refresh_show_counters(venue_ids=venue_ids, artist_ids=artist_ids)
+  db.session.commit()
+  click.echo(f'Rolled {len(started)} shows forward for {len(venue_ids)} venues and {len(artist_ids)} artists.')
+
+@main.cli.command('archive-shows')
+@click.option('--older-than-days', type=int,
+              help='Archive shows that started this many days ago. Defaults to SHOW_ARCHIVE_AFTER_DAYS.')
+@click.option('--batch-size', default=5000, show_default=True, help='Shows moved per transaction.')
+def archive_shows_command(older_than_days, batch_size):
+  '''Moves old shows from the Show table to ShowArchive.'''
+  if older_than_days is None:
+    older_than_days = current_app.config['SHOW_ARCHIVE_AFTER_DAYS']
+  before = datetime.datetime.now() - datetime.timedelta(days=older_than_days)
+  moved = archive_shows(before, batch_size=batch_size)
+  click.echo(f'Archived {moved} shows that started before {before:%Y-%m-%d %H:%M}.')
+
+@main.cli.command('build-assets')
+def build_assets():
+  '''Writes content-hashed, precompressed copies of the static files.'''
+  manifest = assets.build(current_app.static_folder, current_app.config['ASSETS_BUILD_FOLDER'])
+  click.echo(f'Built {len(manifest)} assets into {current_app.config["ASSETS_BUILD_FOLDER"]}.')
+
+@main.cli.command('compile-templates')
+def compile_templates():
+  '''Compiles every template into TEMPLATE_CACHE_FOLDER, so workers start warm.'''
+  if current_app.jinja_env.bytecode_cache is None:
+    raise click.ClickException('TEMPLATE_CACHE_FOLDER is not set.')
+  names = current_app.jinja_env.list_templates()
+  for name in names:
+    current_app.jinja_env.get_template(name)
+  click.echo(f'Compiled {len(names)} templates into {current_app.config["TEMPLATE_CACHE_FOLDER"]}.')
+
+@main.cli.command('create-show-partitions')
+@click.option('--months', default=12, show_default=True, help='Months to create, starting with the current one.')
+def create_show_partitions_command(months):
+  '''Creates the monthly partitions of the Show table ahead of time (Postgres).'''
+  with db.engine.begin() as connection:
+    created = partitions.create_show_partitions(connection, datetime.datetime.now(), months)
+  click.echo(f'Created {len(created)} partitions: {", ".join(created) or "none"}.')
 
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
+app = create_app()
+
 # Default port:
 if __name__ == '__main__':
   app.run()
@@ -0,0 +1,111 @@
+"""Non blocking application logging.
+
+Request threads only put log records on an in-memory queue. A single
+QueueListener thread formats them as JSON lines and writes them to a size
+rotated file, so a slow disk never holds up a request. Every request also
+logs one line with its method, path, status and latency.
+"""
+import json
+import time
+import queue
+import atexit
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import current_app, g, request
+from flask.logging import default_handler
+
+# attributes passed with `extra=` that end up as fields of the JSON record
+REQUEST_FIELDS = ('method', 'path', 'status', 'duration_ms', 'remote_addr')
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": f'{record.pathname}:{record.lineno}',
+        }
+        for field in REQUEST_FIELDS:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps records structured: the message is rendered and
+    the traceback turned into text (neither can safely cross threads), but
+    unlike QueueHandler.prepare the traceback is not merged into the message.
+    Records are dropped rather than blocking when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def init_app(app):
+    """Sends app.logger through a queue to a rotating JSON log file."""
+    file_handler = RotatingFileHandler(
+        app.config['LOG_FILE'],
+        maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT'])
+    file_handler.setFormatter(JSONFormatter())
+    log_queue = queue.Queue(app.config['LOG_QUEUE_SIZE'])
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    # flush what is still queued when the worker exits
+    atexit.register(listener.stop)
+
+    app.logger.setLevel(logging.INFO)
+    # Flask's own handler writes to stderr on the request thread
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(StructuredQueueHandler(log_queue))
+    app.before_request(start_timer)
+    app.after_request(log_request)
+    return listener
+
+
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+def log_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        current_app.logger.info(
+            '%s %s %s %.2fms', request.method, request.path, response.status_code, duration_ms,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": duration_ms,
+                "remote_addr": request.remote_addr,
+            })
+    return response
@@ -0,0 +1,135 @@
+"""Fingerprinted, precompressed static assets.
+
+`flask build-assets` copies every file of the static folder to
+ASSETS_BUILD_FOLDER under a name carrying a hash of its content
+(css/main.css becomes css/main.3f9a1c0e5b7d.css). Text files also get a
+gzip copy, and a brotli one when the brotli package is installed. The
+build writes manifest.json, mapping the original names to the hashed ones.
+url() references between CSS and other assets are rewritten to the hashed
+names. Files of earlier builds are kept, so pages rendered before a
+deploy still find their assets.
+
+When the manifest exists, `init_app` makes url_for('static', filename=...)
+emit the hashed names. It serves hashed files in the best encoding the
+client accepts, with a far-future immutable Cache-Control: a changed file
+gets a new name, so a cached copy never has to be checked again. Without a
+manifest, e.g. in development, static files are served as usual.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+import posixpath
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+# a year, the longest lifetime caches honor
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.ttf', '.otf', '.eot', '.ico'}
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def hashed_name(name, content):
+    stem, extension = posixpath.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+
+
+def rewrite_css(name, content, manifest):
+    """Points the relative url() references of a stylesheet to hashed files."""
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        if not path or path.startswith(('/', 'data:')) or '://' in path:
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(directory, path))
+        if target not in manifest:
+            return match.group(0)
+        return f'url({quote}{posixpath.relpath(manifest[target], directory or ".")}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def compressed_copies(content):
+    """(suffix, bytes) of the compressed copies worth keeping."""
+    copies = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        copies.append(('.br', brotli.compress(content, quality=11)))
+    return [(suffix, data) for suffix, data in copies if len(data) < len(content)]
+
+
+def build(static_folder, build_folder):
+    """Builds the assets of `static_folder` into `build_folder`, returning the manifest."""
+    names = []
+    for directory, _, files in os.walk(static_folder):
+        relative = os.path.relpath(directory, static_folder)
+        names.extend(posixpath.normpath(posixpath.join(relative.replace(os.sep, '/'), file)) for file in files)
+    manifest = {}
+    # stylesheets last, so the files they refer to already have their names
+    for name in sorted(names, key=lambda name: (name.endswith('.css'), name)):
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+        if name.endswith('.css'):
+            content = rewrite_css(name, content, manifest)
+        manifest[name] = hashed_name(name, content)
+        path = os.path.join(build_folder, manifest[name])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        copies = [('', content)]
+        if posixpath.splitext(name)[1].lower() in COMPRESSIBLE:
+            copies.extend(compressed_copies(content))
+        for suffix, data in copies:
+            with open(path + suffix, 'wb') as f:
+                f.write(data)
+    with open(os.path.join(build_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def init_app(app):
+    """Serves the assets built into ASSETS_BUILD_FOLDER, if there are any."""
+    folder = app.config['ASSETS_BUILD_FOLDER']
+    try:
+        with open(os.path.join(folder, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    # encodings available for each hashed file, best first
+    encodings = {
+        hashed: [(encoding, suffix) for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+                 if os.path.exists(os.path.join(folder, hashed + suffix))]
+        for hashed in manifest.values()
+    }
+
+    def hashed_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    static_view = app.view_functions['static']
+
+    def static(filename):
+        if filename not in encodings:
+            return static_view(filename=filename)
+        for encoding, suffix in encodings[filename]:
+            if encoding in request.accept_encodings:
+                response = send_from_directory(
+                    folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(folder, filename)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.url_defaults(hashed_url)
+    app.view_functions['static'] = static
+    return manifest
@@ -0,0 +1,122 @@
+"""In-memory prefix index of venue and artist names for typeahead lookups."""
+import time
+import bisect
+import threading
+
+
+def normalize(name):
+    """The form names are compared in, which is lower(name) in the database."""
+    return name.lower()
+
+
+def normalize_prefix(prefix):
+    """A typed prefix in that form, runs of whitespace read as one space."""
+    return ' '.join(normalize(prefix).split())
+
+
+class PrefixIndex:
+    """
+    Names kept sorted by their normalized form, so the names starting with a
+    prefix are a contiguous run found by bisection. `load` returns the (id,
+    name) pairs to index; it is called on first use and again `ttl` seconds
+    after the last load, which picks up writes made by other processes. Writes
+    made by this process are applied right away with `set` and `discard`.
+    A single thread reloads at a time; the others keep searching the names
+    already loaded, or wait for the first load.
+
+    Tables with more than `max_entries` rows are not kept in memory: `search`
+    then returns None and callers query the database instead. `count`, when
+    given, returns the number of rows (or any number above `max_entries` once
+    there are more), so a table known to be too large is only counted again
+    every `ttl` seconds, not loaded.
+    """
+
+    def __init__(self, load, count=None, ttl=None, max_entries=None):
+        self.load = load
+        self.count = count
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._keys = None
+        self._names = {}
+        self._too_large = False
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def _stale(self):
+        return self._loaded_at is None or (
+            self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl)
+
+    def _refresh(self):
+        if not self._stale():
+            return
+        loaded = self._keys is not None or self._too_large
+        if not self._reload_lock.acquire(blocking=not loaded):
+            return
+        try:
+            # another thread may have reloaded while this one waited
+            if self._stale():
+                self._reload()
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self):
+        names, keys = {}, []
+        if self.max_entries is not None and self.count is not None and self.count() > self.max_entries:
+            keys = None
+        else:
+            for record_id, name in self.load():
+                if self.max_entries is not None and len(names) >= self.max_entries:
+                    names, keys = {}, None
+                    break
+                names[record_id] = name
+                keys.append((normalize(name), record_id))
+        if keys is not None:
+            keys.sort()
+        with self._lock:
+            self._names, self._keys = names, keys
+            self._too_large = keys is None
+            self._loaded_at = time.monotonic()
+
+    def search(self, prefix, limit=10):
+        """Returns up to `limit` (id, name) pairs whose name starts with `prefix`."""
+        self._refresh()
+        prefix = normalize_prefix(prefix)
+        with self._lock:
+            if self._keys is None:
+                return None
+            matches = []
+            position = bisect.bisect_left(self._keys, (prefix,))
+            for key, record_id in self._keys[position:position + limit]:
+                if not key.startswith(prefix):
+                    break
+                matches.append((record_id, self._names[record_id]))
+            return matches
+
+    def set(self, record_id, name):
+        """Adds a record or renames it."""
+        with self._lock:
+            if self._keys is None:
+                return
+            self._remove(record_id)
+            self._names[record_id] = name
+            bisect.insort(self._keys, (normalize(name), record_id))
+
+    def discard(self, record_ids):
+        with self._lock:
+            if self._keys is None:
+                return
+            for record_id in record_ids:
+                self._remove(record_id)
+
+    def _remove(self, record_id):
+        name = self._names.pop(record_id, None)
+        if name is not None:
+            entry = (normalize(name), record_id)
+            position = bisect.bisect_left(self._keys, entry)
+            if position < len(self._keys) and self._keys[position] == entry:
+                del self._keys[position]
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
@@ -0,0 +1,95 @@
+"""Benchmark for the faceted venue browsing of /venues/browse.
+
+Seeds N venues (100k by default) spread over 50 states and 1000 cities, each
+with one to three of the form's genres, then times `browse()` for a few filter
+combinations such as "Jazz venues in NY". Its facet counts come from one
+GROUPING SETS query (`facet_counts()`), timed on its own and against the same
+counts computed with one GROUP BY query per facet.
+
+The benchmark drops and recreates all tables, so it runs against its own
+database (`fyyur_bench`, whatever DB_NAME is set to):
+
+    createdb fyyur_bench
+    python benchmarks/bench_browse.py 100000
+"""
+import os
+import sys
+import time
+import random
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_NAME'] = 'fyyur_bench'
+
+from sqlalchemy import func, select
+from app import app, db, Venue, Genre, GENRES, venue_genres, browse, browse_conditions, facet_counts
+
+FILTERS = [
+    {},
+    {"genre": 'Jazz'},
+    {"state": 'NY'},
+    {"genre": 'Jazz', "state": 'NY'},
+    {"genre": 'Jazz', "state": 'NY', "city": 'City 49'},
+]
+STATES = [f'S{i:02d}' for i in range(49)] + ['NY']
+REPEAT = 5
+
+
+def seed(venue_count):
+    db.drop_all()
+    db.create_all()
+    rnd = random.Random(venue_count)
+    genre_ids = dict(db.session.execute(select([Genre.name, Genre.id])).fetchall())
+    for start in range(1, venue_count + 1, 10000):
+        stop = min(start + 10000, venue_count + 1)
+        db.session.execute(Venue.__table__.insert(), [{
+            "id": i, "name": f'Venue {i}', "city": f'City {i % 1000}',
+            "state": STATES[i % 1000 % len(STATES)], "address": f'{i} Main St',
+        } for i in range(start, stop)])
+        db.session.execute(venue_genres.insert(), [
+            {"venue_id": i, "genre_id": genre_ids[genre]}
+            for i in range(start, stop) for genre in rnd.sample(GENRES, rnd.randint(1, 3))])
+    db.session.commit()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute('ANALYZE')
+    db.session.remove()
+
+
+def separate_queries(filters):
+    # the facet counts of browse(), one GROUP BY query each
+    conditions = browse_conditions(Venue, **filters)
+    count = func.count(Venue.id.distinct())
+    base = db.session.query(Venue).outerjoin(Venue.genre_records).filter(*conditions)
+    return (
+        base.with_entities(Genre.name, count).group_by(Genre.name).all(),
+        base.with_entities(Venue.state, Venue.city, count).group_by(Venue.state, Venue.city).all(),
+        base.with_entities(Venue.state, count).group_by(Venue.state).all(),
+        base.with_entities(count).scalar(),
+    )
+
+
+def measure(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main(venue_count):
+    seed(venue_count)
+    print(f'{venue_count} venues')
+    print(f'{"filters":>34} {"matches":>8} {"browse ms":>10} {"GROUPING SETS ms":>17} {"4 GROUP BYs ms":>15}')
+    for filters in FILTERS:
+        matches = browse(Venue, 1, 50, **filters)["count"]
+        page = measure(lambda: browse(Venue, 1, 50, **filters))
+        grouping_sets = measure(lambda: facet_counts(Venue, browse_conditions(Venue, **filters)))
+        group_bys = measure(lambda: separate_queries(filters))
+        label = ', '.join(f'{key}={value}' for key, value in filters.items()) or '-'
+        print(f'{label:>34} {matches:>8} {page:>10.1f} {grouping_sets:>17.1f} {group_bys:>15.1f}')
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
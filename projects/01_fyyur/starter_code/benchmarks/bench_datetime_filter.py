@@ -0,0 +1,56 @@
+"""Micro-benchmark for the `datetime` Jinja filter.
+
+Compares the previous filter (re-parse `str(start_time)` with dateutil and
+format through `babel.dates.format_datetime`) with the current one, which
+takes datetimes directly and reuses the parsed babel pattern and locale.
+
+    python benchmarks/bench_datetime_filter.py
+"""
+import os
+import sys
+import timeit
+import datetime
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_NAME'] = 'fyyur_bench'
+
+from app import app, format_datetime
+
+NUMBER = 20000
+
+
+def legacy_format_datetime(value, format='medium'):
+    # the filter this benchmark is measured against
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main():
+    start_time = datetime.datetime(2035, 4, 15, 20, 0)
+    assert legacy_format_datetime(str(start_time), 'full') == format_datetime(start_time, 'full')
+    cases = [
+        ('legacy, str', lambda: legacy_format_datetime(str(start_time), 'full')),
+        ('current, str', lambda: format_datetime(str(start_time), 'full')),
+        ('current, datetime', lambda: format_datetime(start_time, 'full')),
+    ]
+    print(f'{"filter":>18} {"us per call":>12}')
+    for name, fn in cases:
+        seconds = min(timeit.repeat(fn, number=NUMBER, repeat=3))
+        print(f'{name:>18} {seconds / NUMBER * 1e6:>12.2f}')
+
+    template = app.jinja_env.from_string(
+        "{% for show in shows %}{{ show.start_time|datetime('full') }}{% endfor %}")
+    shows = [{"start_time": start_time + datetime.timedelta(hours=i)} for i in range(500)]
+    seconds = min(timeit.repeat(lambda: template.render(shows=shows), number=20, repeat=3))
+    print(f'rendering 500 shows: {seconds / 20 * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
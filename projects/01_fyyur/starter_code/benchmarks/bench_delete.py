@@ -0,0 +1,78 @@
+"""Benchmark for deleting a venue with many shows.
+
+Books N artists (100k by default) at a single venue, then deletes the venue
+twice: once the way the ORM cascade used to do it (load every show into the
+session and delete them one by one before the venue) and once with
+`delete_records()`, which leaves the shows to ON DELETE CASCADE and only
+reads the artist ids whose counters need a refresh.
+
+The benchmark drops and recreates all tables, so it runs against its own
+database (`fyyur_bench`, whatever DB_NAME is set to):
+
+    createdb fyyur_bench
+    python benchmarks/bench_delete.py 100000
+"""
+import os
+import sys
+import time
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_NAME'] = 'fyyur_bench'
+
+from app import app, db, Venue, Artist, Shows, delete_records, refresh_show_counters
+
+
+def seed(show_count):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(Venue.__table__.insert(), [{
+        "id": 1, "name": 'Stadium', "city": 'San Francisco', "state": 'CA',
+        "address": '1 Stadium Way',
+    }])
+    now = datetime.datetime.now()
+    for start in range(1, show_count + 1, 10000):
+        stop = min(start + 10000, show_count + 1)
+        db.session.execute(Artist.__table__.insert(), [{
+            "id": i, "name": f'Artist {i}', "city": 'San Francisco', "state": 'CA',
+        } for i in range(start, stop)])
+        db.session.execute(Shows.__table__.insert(), [{
+            "artist_id": i, "venue_id": 1, "start_time": now + datetime.timedelta(hours=i - show_count // 2),
+        } for i in range(start, stop)])
+    db.session.commit()
+    db.session.remove()
+
+
+def legacy_delete(venue_id):
+    # what cascade="all, delete" on the relationships amounted to
+    venue = Venue.query.get(venue_id)
+    artist_ids = set()
+    for show in Shows.query.filter_by(venue_id=venue_id):
+        artist_ids.add(show.artist_id)
+        db.session.delete(show)
+    db.session.delete(venue)
+    db.session.flush()
+    refresh_show_counters(artist_ids=artist_ids)
+    db.session.commit()
+    db.session.remove()
+
+
+def measure(label, fn, show_count):
+    seed(show_count)
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    assert Shows.query.count() == 0
+    db.session.remove()
+    print(f'{label:>16} {elapsed:>10.2f} s')
+
+
+def main(show_count):
+    print(f'deleting a venue with {show_count} shows')
+    measure('ORM cascade', lambda: legacy_delete(1), show_count)
+    measure('delete_records', lambda: delete_records(Venue, [1]), show_count)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,202 @@
+"""Load test of the Fyyur pages with latency percentiles per route.
+
+Runs entirely in one process: `--threads` client threads send requests to the
+WSGI app through Flask test clients (no server or network involved) for
+`--duration` seconds, then p50/p95/p99 latencies are printed per route.
+Requests follow a weighted mix of the pages people use, with venue and artist
+ids drawn with the same Zipf skew as the generated data, so popular pages get
+most of the traffic.
+
+With `--venues/--artists/--shows` the tables are recreated and filled by the
+seeded generator of synthetic.py first, so it runs against its own database
+(`fyyur_bench`, whatever DB_NAME is set to):
+
+    createdb fyyur_bench
+    python benchmarks/bench_load.py --venues 10000 --artists 20000 --shows 500000 --output base.json
+    # after a change, on the same data
+    python benchmarks/bench_load.py --baseline base.json
+
+With `--baseline` the run fails (exit status 1) when the p95 of a route is
+more than `--tolerance` (20% by default) slower than in the baseline.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+import statistics
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_NAME'] = 'fyyur_bench'
+
+from app import create_app, db, Venue, Artist, IMPORTABLE, refresh_all_show_counters
+import synthetic
+
+# as in production: errors become 500 responses, templates are not reloaded
+app = create_app({'DEBUG': False})
+
+
+def seed(venues, artists, shows, seed_value):
+    db.drop_all()
+    db.create_all()
+    tables = {entity: (model.__table__, links) for entity, (model, _, links) in IMPORTABLE.items()}
+    synthetic.generate(db.engine, tables, venues, artists, shows, seed=seed_value)
+    refresh_all_show_counters()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute('ANALYZE')
+        db.session.commit()
+    db.session.remove()
+
+
+class Picker:
+    """Draws venue and artist ids, the popular ones more often."""
+
+    def __init__(self, rnd):
+        self.venue_ids = [venue_id for (venue_id,) in db.session.query(Venue.id)]
+        self.artist_ids = [artist_id for (artist_id,) in db.session.query(Artist.id)]
+        self.cities = [city for city, _ in synthetic.CITIES]
+        for ids in (self.venue_ids, self.artist_ids):
+            rnd.shuffle(ids)
+        self.venue_weights = synthetic.zipf_weights(len(self.venue_ids))
+        self.artist_weights = synthetic.zipf_weights(len(self.artist_ids))
+        self.city_weights = synthetic.zipf_weights(len(self.cities))
+        db.session.remove()
+
+    def venue(self, rnd):
+        return rnd.choices(self.venue_ids, cum_weights=self.venue_weights)[0]
+
+    def artist(self, rnd):
+        return rnd.choices(self.artist_ids, cum_weights=self.artist_weights)[0]
+
+    def city(self, rnd):
+        return rnd.choices(self.cities, cum_weights=self.city_weights)[0]
+
+
+def tomorrow_evening(rnd):
+    day = datetime.date.today() + datetime.timedelta(days=rnd.randint(1, 180))
+    return datetime.datetime.combine(day, datetime.time(20, rnd.randint(0, 59), rnd.randint(0, 59)))
+
+
+# (route, weight, request): `request(rnd, picker)` returns the test client
+# method, the URL and its keyword arguments
+ROUTES = [
+    ('GET /venues/<id>', 25, lambda rnd, p: ('get', f'/venues/{p.venue(rnd)}', {})),
+    ('GET /artists/<id>', 25, lambda rnd, p: ('get', f'/artists/{p.artist(rnd)}', {})),
+    ('GET /venues', 3, lambda rnd, p: ('get', '/venues', {})),
+    ('GET /artists', 3, lambda rnd, p: ('get', '/artists', {})),
+    ('GET /shows', 8, lambda rnd, p: ('get', '/shows', {})),
+    ('GET /shows?venue_id=', 5, lambda rnd, p: (
+        'get', f'/shows?venue_id={p.venue(rnd)}', {"headers": {"Accept": "application/json"}})),
+    ('GET /search?q=', 10, lambda rnd, p: (
+        'get', f'/search?q={rnd.choice(synthetic.GENRES)}+{p.city(rnd)}', {})),
+    ('GET /venues/autocomplete?q=', 8, lambda rnd, p: (
+        'get', f'/venues/autocomplete?q={rnd.choice(synthetic.ADJECTIVES)[:rnd.randint(1, 4)]}', {})),
+    ('GET /venues/browse?genre=', 5, lambda rnd, p: (
+        'get', f'/venues/browse?genre={rnd.choice(synthetic.GENRES)}', {})),
+    ('POST /shows/create', 2, lambda rnd, p: ('post', '/shows/create', {"data": {
+        "artist_id": p.artist(rnd), "venue_id": p.venue(rnd),
+        "start_time": tomorrow_evening(rnd).strftime('%Y-%m-%d %H:%M:%S')}})),
+]
+
+
+def client_thread(number, deadline, picker, results):
+    rnd = random.Random(number)
+    client = app.test_client()
+    weights = [weight for _, weight, _ in ROUTES]
+    while time.perf_counter() < deadline:
+        route, _, make_request = rnd.choices(ROUTES, weights=weights)[0]
+        method, url, kwargs = make_request(rnd, picker)
+        start = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        response.close()
+        results.append((route, time.perf_counter() - start, response.status_code))
+
+
+def percentiles(timings):
+    if len(timings) == 1:
+        return timings * 3
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return [cuts[49], cuts[94], cuts[98]]
+
+
+def run(threads, duration):
+    picker = Picker(random.Random(0))
+    results = []
+    start = time.perf_counter()
+    deadline = start + duration
+    workers = [threading.Thread(target=client_thread, args=(number, deadline, picker, results))
+               for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # requests still running at the deadline are finished and counted
+    elapsed = time.perf_counter() - start
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    for route, seconds, status in results:
+        by_route[route].append(seconds * 1000)
+        if status >= 500:
+            errors[route] += 1
+    summary = {}
+    for route, _, _ in ROUTES:
+        if by_route[route]:
+            p50, p95, p99 = percentiles(by_route[route])
+            summary[route] = {"requests": len(by_route[route]), "errors": errors[route],
+                              "p50": p50, "p95": p95, "p99": p99}
+    return summary, len(results) / elapsed
+
+
+def report(summary, throughput, baseline=None, tolerance=0.2):
+    """Prints the summary; returns the routes whose p95 regressed against `baseline`."""
+    regressions = []
+    print(f'{"route":>30} {"requests":>9} {"errors":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for route, stats in summary.items():
+        line = (f'{route:>30} {stats["requests"]:>9} {stats["errors"]:>7} '
+                f'{stats["p50"]:>8.1f} {stats["p95"]:>8.1f} {stats["p99"]:>8.1f}')
+        before = (baseline or {}).get(route)
+        if before:
+            change = stats["p95"] / before["p95"] - 1
+            line += f'  p95 {change:+.0%}'
+            if change > tolerance:
+                regressions.append(route)
+                line += ' REGRESSION'
+        print(line)
+    print(f'{throughput:.0f} requests/s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--venues', type=int, help='recreate the tables with generated data')
+    parser.add_argument('--artists', type=int)
+    parser.add_argument('--shows', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown')
+    args = parser.parse_args()
+    with app.app_context():
+        if args.venues is not None:
+            seed(args.venues, args.artists or args.venues * 2, args.shows or args.venues * 20, args.seed)
+        summary, throughput = run(args.threads, args.duration)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["routes"]
+    regressions = report(summary, throughput, baseline, args.tolerance)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"routes": summary, "requests_per_second": throughput}, f, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Offline benchmark for venue/artist name search.
+
+Runs against an in-memory SQLite stand-in of the Venue table, so it needs no
+database server. It compares the previous search path (a COUNT query plus a
+second query iterating every match) with the single windowed query used by
+`search_by_name` in app.py, which returns the total and a capped page at once.
+
+SQLite has no trigram index, so both paths scan the table here; the numbers
+show the cost of the extra round trip and of materialising every match.
+
+    python benchmarks/bench_search.py 10000 100000 1000000
+"""
+import sys
+import time
+import random
+import statistics
+
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, select, func
+
+WORDS = ['the', 'musical', 'hop', 'park', 'square', 'live', 'music', 'coffee',
+         'dueling', 'pianos', 'bar', 'wild', 'sax', 'band', 'guns', 'petals',
+         'jazz', 'club', 'hall', 'room', 'stage', 'garden', 'house', 'loft']
+TERMS = ['hop', 'music', 'sax band', 'zzz']
+LIMIT = 50
+REPEAT = 5
+
+metadata = MetaData()
+venue = Table(
+    'Venue', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+)
+
+
+def seed(engine, count):
+    rnd = random.Random(count)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(venue.insert(), [
+            {"name": ' '.join(rnd.choice(WORDS) for _ in range(3)).title()}
+            for _ in range(count)])
+
+
+def two_queries(conn, term):
+    matches = venue.c.name.ilike(f'%{term}%')
+    count = conn.execute(select([func.count()]).select_from(venue).where(matches)).scalar()
+    data = [{"id": row.id, "name": row.name}
+            for row in conn.execute(select([venue.c.id, venue.c.name]).where(matches))]
+    return count, data
+
+
+def one_query(conn, term):
+    rows = conn.execute(
+        select([venue.c.id, venue.c.name, func.count().over().label('total')])
+        .where(venue.c.name.ilike(f'%{term}%'))
+        .order_by(venue.c.name, venue.c.id)
+        .limit(LIMIT)).fetchall()
+    count = rows[0].total if rows else 0
+    return count, [{"id": row.id, "name": row.name} for row in rows]
+
+
+def measure(fn, conn, term):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(conn, term)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main(sizes):
+    print(f'{"rows":>9} {"term":>9} {"matches":>8} {"two queries ms":>15} {"one query ms":>13}')
+    for size in sizes:
+        engine = create_engine('sqlite://')
+        seed(engine, size)
+        with engine.connect() as conn:
+            for term in TERMS:
+                matches, _ = one_query(conn, term)
+                assert matches == two_queries(conn, term)[0]
+                before = measure(two_queries, conn, term)
+                after = measure(one_query, conn, term)
+                print(f'{size:>9} {term:>9} {matches:>8} {before:>15.1f} {after:>13.1f}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
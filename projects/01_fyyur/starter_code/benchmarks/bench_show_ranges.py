@@ -0,0 +1,120 @@
+"""Benchmark for time-range show queries at scale.
+
+Fills the Show table with N shows (10 million by default) spread over four
+years, 1000 artists and as many venues as needed, then times
+`GET /shows?venue_id=&from=&to=` and `GET /shows?artist_id=&from=&to=`
+for random 30 day windows. On Postgres the shows are spread over monthly
+partitions and the plan of each query shape is printed, so partition
+pruning and the index range scans can be checked.
+
+The benchmark drops and recreates all tables, so it runs against its own
+database (`fyyur_bench`, whatever DB_NAME is set to). Seeding 10M
+rows takes a few minutes on Postgres:
+
+    createdb fyyur_bench
+    python benchmarks/bench_show_ranges.py 10000000
+"""
+import os
+import sys
+import time
+import random
+import datetime
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_NAME'] = 'fyyur_bench'
+
+from sqlalchemy import text
+from app import app, db, Venue, Artist, Shows
+from partitions import create_show_partitions
+
+ARTISTS = 1000
+FIRST_DAY = datetime.datetime(2020, 1, 1)
+DAYS = 4 * 365
+SAMPLES = 200
+
+
+def seed(show_count):
+    # show i is artist (i % ARTISTS) at venue (i // ARTISTS), keeping (artist, venue) unique
+    venues = max(1, -(-show_count // ARTISTS))
+    db.drop_all()
+    db.create_all()
+    if db.engine.dialect.name == 'postgresql':
+        # one partition per month of the seeded period
+        create_show_partitions(db.session.connection(), FIRST_DAY, DAYS // 28)
+        db.session.execute(text('''
+            INSERT INTO "Venue" (name, city, state, address)
+            SELECT 'Venue ' || i, 'City ' || i % 200, 'CA', i || ' Main St'
+            FROM generate_series(1, :venues) AS i'''), {"venues": venues})
+        db.session.execute(text('''
+            INSERT INTO "Artist" (name, city, state)
+            SELECT 'Artist ' || i, 'San Francisco', 'CA'
+            FROM generate_series(1, :artists) AS i'''), {"artists": ARTISTS})
+        db.session.execute(text('''
+            INSERT INTO "Show" (artist_id, venue_id, start_time)
+            SELECT i % :artists + 1, i / :artists + 1,
+                   :first_day + random() * (:days * interval '1 day')
+            FROM generate_series(0, :shows - 1) AS i'''),
+            {"artists": ARTISTS, "shows": show_count, "first_day": FIRST_DAY, "days": DAYS})
+        db.session.commit()
+        db.session.execute(text('ANALYZE'))
+        return venues
+    rnd = random.Random(show_count)
+    db.session.execute(Venue.__table__.insert(), [{
+        "name": f'Venue {i}', "city": f'City {i % 200}', "state": 'CA',
+        "address": f'{i} Main St',
+    } for i in range(1, venues + 1)])
+    db.session.execute(Artist.__table__.insert(), [{
+        "name": f'Artist {i}', "city": 'San Francisco', "state": 'CA',
+    } for i in range(1, ARTISTS + 1)])
+    for start in range(0, show_count, 100000):
+        db.session.execute(Shows.__table__.insert(), [{
+            "artist_id": i % ARTISTS + 1,
+            "venue_id": i // ARTISTS + 1,
+            "start_time": FIRST_DAY + datetime.timedelta(seconds=rnd.randrange(DAYS * 86400)),
+        } for i in range(start, min(start + 100000, show_count))])
+    db.session.commit()
+    return venues
+
+
+def explain(column, value, start, end):
+    if db.engine.dialect.name != 'postgresql':
+        return
+    plan = db.session.execute(text(f'''
+        EXPLAIN ANALYZE SELECT * FROM "Show"
+        WHERE {column} = :value AND start_time >= :start AND start_time < :end
+        ORDER BY start_time'''), {"value": value, "start": start, "end": end})
+    for (line,) in plan:
+        print('    ' + line)
+
+
+def measure(client, column, count, rnd):
+    timings = []
+    for _ in range(SAMPLES):
+        start = FIRST_DAY + datetime.timedelta(days=rnd.randrange(DAYS - 30))
+        url = (f'/shows?{column}={rnd.randint(1, count)}'
+               f'&from={start.isoformat()}&to={(start + datetime.timedelta(days=30)).isoformat()}')
+        began = time.perf_counter()
+        res = client.get(url, headers={'Accept': 'application/json'})
+        timings.append((time.perf_counter() - began) * 1000)
+        assert res.status_code == 200, res.status_code
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main(show_count):
+    began = time.perf_counter()
+    venues = seed(show_count)
+    print(f'seeded {show_count} shows, {venues} venues, {ARTISTS} artists '
+          f'in {time.perf_counter() - began:.0f}s')
+    client = app.test_client()
+    rnd = random.Random(0)
+    for column, count in (('venue_id', venues), ('artist_id', ARTISTS)):
+        p50, p95 = measure(client, column, count, rnd)
+        print(f'GET /shows?{column}=&from=&to=  p50 {p50:.1f} ms  p95 {p95:.1f} ms')
+        explain(column, 1, FIRST_DAY, FIRST_DAY + datetime.timedelta(days=30))
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
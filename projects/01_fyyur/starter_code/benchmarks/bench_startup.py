@@ -0,0 +1,82 @@
+"""Benchmark for the cold start of a worker.
+
+Every run is a fresh Python process that imports the app and serves its first
+requests with the test client, timing:
+
+* import: `import app`, which builds the app with `create_app()`
+* first response: GET / right after the import, no query involved
+* first query: the following GET /venues/0, a 404 after one lookup, which
+  opens the first connection
+
+in three modes: `lazy` (the default, nothing touches the database before a
+query needs it), `bootstrap` (SCHEMA_BOOTSTRAP=true, the first request checks
+the schema) and `eager` (`db.create_all()` right after the import, as every
+import used to do).
+
+The tables are created first if needed, so the benchmark runs against its own
+database (`fyyur_bench`, whatever DB_NAME is set to):
+
+    createdb fyyur_bench
+    python benchmarks/bench_startup.py 20
+"""
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_NAME'] = 'fyyur_bench'
+
+MODES = ('lazy', 'bootstrap', 'eager')
+STEPS = ('import', 'first response', 'first query')
+
+
+def child(mode):
+    # runs in the measured process, prints the timings of its steps as JSON
+    if mode == 'bootstrap':
+        os.environ['SCHEMA_BOOTSTRAP'] = 'true'
+    start = time.perf_counter()
+    import app as fyyur
+    imported = time.perf_counter()
+    if mode == 'eager':
+        with fyyur.app.app_context():
+            fyyur.db.create_all()
+    client = fyyur.app.test_client()
+    assert client.get('/').status_code == 200
+    responded = time.perf_counter()
+    assert client.get('/venues/0').status_code == 404
+    queried = time.perf_counter()
+    print(json.dumps({
+        "import": imported - start,
+        "first response": responded - start,
+        "first query": queried - start,
+    }))
+
+
+def run(mode):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(repeat):
+    run('eager')
+    timings = {mode: {step: [] for step in STEPS} for mode in MODES}
+    for _ in range(repeat):
+        for mode in MODES:
+            for step, seconds in run(mode).items():
+                timings[mode][step].append(seconds * 1000)
+    print(f'median of {repeat} cold starts, ms since the start of `import app`')
+    print(f'{"mode":>10}' + ''.join(f'{step:>16}' for step in STEPS))
+    for mode in MODES:
+        print(f'{mode:>10}' + ''.join(f'{statistics.median(timings[mode][step]):>16.1f}' for step in STEPS))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
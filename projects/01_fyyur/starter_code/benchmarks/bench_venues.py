@@ -0,0 +1,105 @@
+"""Benchmark for the /venues listing.
+
+Compares the previous implementation (load every venue, group in nested
+Python dicts) with `venue_areas()` used by the app, which streams the venues
+in area order together with their upcoming show counters, for a growing
+number of venues.
+
+The benchmark drops and recreates all tables, so it runs against its own
+database (`fyyur_bench`, whatever DB_NAME is set to):
+
+    createdb fyyur_bench
+    python benchmarks/bench_venues.py 1000 10000 50000
+"""
+import os
+import sys
+import time
+import random
+import datetime
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_NAME'] = 'fyyur_bench'
+
+from app import app, db, Venue, Artist, Shows, venue_areas, refresh_all_show_counters
+
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'FL', 'MA', 'CO', 'OR', 'GA']
+REPEAT = 5
+
+
+def legacy_areas():
+    # the /venues implementation this benchmark is measured against
+    STATE, CITY, NAME, ID = 0, 1, 2, 3
+    venues = db.session.query(Venue.state, Venue.city, Venue.name, Venue.id).all()
+    raw_data = {}
+    for v in venues:
+        if raw_data.get(v[STATE]) is None:
+            raw_data[v[STATE]] = {}
+        if raw_data[v[STATE]].get(v[CITY]) is None:
+            raw_data[v[STATE]][v[CITY]] = []
+        raw_data[v[STATE]][v[CITY]].append({
+            "name": v[NAME],
+            "id": v[ID],
+        })
+    data = []
+    for state in raw_data:
+        for city in raw_data[state]:
+            data.append({
+                "city": city,
+                "state": state,
+                "venues": raw_data[state][city]
+            })
+    return data
+
+
+def seed(venue_count):
+    db.drop_all()
+    db.create_all()
+    rnd = random.Random(venue_count)
+    db.session.execute(Venue.__table__.insert(), [{
+        "name": f'Venue {i}',
+        "city": f'City {rnd.randrange(200)}',
+        "state": rnd.choice(STATES),
+        "address": f'{i} Main St',
+    } for i in range(1, venue_count + 1)])
+    db.session.execute(Artist.__table__.insert(), [{
+        "name": f'Artist {i}',
+        "city": 'San Francisco',
+        "state": 'CA',
+    } for i in range(1, 101)])
+    now = datetime.datetime.now()
+    db.session.execute(Shows.__table__.insert(), [{
+        "artist_id": artist_id,
+        "venue_id": venue_id,
+        "start_time": now + datetime.timedelta(days=rnd.randint(-365, 365)),
+    } for venue_id in range(1, venue_count + 1)
+      for artist_id in rnd.sample(range(1, 101), 3)])
+    db.session.commit()
+    # venue_areas() reads the counters, which raw inserts leave at zero
+    refresh_all_show_counters()
+
+
+def measure(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        db.session.remove()
+    return statistics.median(timings) * 1000
+
+
+def main(sizes):
+    client = app.test_client()
+    print(f'{"venues":>8} {"legacy ms":>10} {"grouped ms":>11} {"GET /venues ms":>15}')
+    for size in sizes:
+        seed(size)
+        legacy = measure(legacy_areas)
+        grouped = measure(lambda: list(venue_areas()))
+        page = measure(lambda: client.get('/venues').data)
+        print(f'{size:>8} {legacy:>10.1f} {grouped:>11.1f} {page:>15.1f}')
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        main([int(arg) for arg in sys.argv[1:]] or [1000, 5000, 20000])
@@ -0,0 +1,193 @@
+"""Streaming bulk import of venues, artists and shows.
+
+Records are read one at a time from CSV or JSON lines files, validated with
+the forms from forms.py and written in batches, one transaction per batch:
+COPY on Postgres, executemany everywhere else. A batch the database rejects
+(e.g. a show pointing at an unknown venue) is retried row by row so only
+the offending rows are skipped.
+
+In CSV files multi-valued fields such as genres are separated by `;`,
+JSON lines files may use lists. Dates use the ShowForm format,
+`YYYY-MM-DD HH:MM:SS`. Multi-valued fields stored in an association table
+(see `Link`) are written along with their records. Empty and missing fields
+are stored as NULL.
+"""
+import io
+import csv
+import json
+import time
+import datetime
+from itertools import islice
+from collections import namedtuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+from wtforms import SelectMultipleField
+
+
+# A multi-valued form field stored in an association table, e.g. the genres of
+# a venue: `table` pairs the record's id (`column`) with the id of each value
+# (`value_column`), `lookup(connection, values)` returning {value: id}.
+Link = namedtuple('Link', 'field table column value_column lookup')
+
+
+def read_rows(path):
+    """Yields one dict per record of a .csv or .jsonl file."""
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def to_formdata(row, multi_valued):
+    """Turns a record into the MultiDict a submitted form would carry."""
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None or value == '':
+            continue
+        if key in multi_valued:
+            values = value if isinstance(value, list) else value.split(';')
+            data.setlist(key, [str(v).strip() for v in values])
+        else:
+            data.add(key, str(value))
+    return data
+
+
+def validate(rows, form_class, columns):
+    """
+    Yields (line, record, errors) for every row. `record` holds the validated
+    form data of the given columns, None for empty fields (COPY reads an
+    empty value as NULL, so every way of writing a batch stores the same),
+    `errors` the form errors of invalid rows.
+    """
+    multi_valued = {name for name, field in form_class(meta={'csrf': False})._fields.items()
+                    if isinstance(field, SelectMultipleField)}
+    for line, row in enumerate(rows, start=1):
+        form = form_class(formdata=to_formdata(row, multi_valued), meta={'csrf': False})
+        if form.validate():
+            yield line, {column: None if form[column].data == '' else form[column].data
+                         for column in columns}, None
+        else:
+            yield line, None, form.errors
+
+
+def copy_value(value):
+    # COPY ... WITH (FORMAT csv) text representation of a column value
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(' ')
+    return value
+
+
+def copy_records(connection, table, columns, records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow([copy_value(record[column]) for column in columns])
+    buffer.seek(0)
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def write_records(connection, table, columns, records):
+    # single rows are the retries of a rejected batch, inserted normally so
+    # errors come wrapped like any other statement's
+    if connection.dialect.name == 'postgresql' and len(records) > 1:
+        copy_records(connection, table, columns, records)
+    else:
+        connection.execute(table.insert(), [{column: record[column] for column in columns} for record in records])
+
+
+def insert_records(connection, table, columns, records, links=()):
+    """
+    Inserts records into `table` and their linked values into the links'
+    association tables. With links the ids of the records are needed: they
+    are drawn from the id sequence up front on Postgres so the records can
+    still be copied, elsewhere (and for the single rows retried after a
+    rejected batch) records are inserted one by one.
+    """
+    if not links:
+        write_records(connection, table, columns, records)
+        return
+    if connection.dialect.name == 'postgresql' and len(records) > 1:
+        ids = [record_id for (record_id,) in connection.execute(text(
+            "SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+            table=f'"{table.name}"', count=len(records))]
+        copy_records(connection, table, columns + ['id'],
+                     [dict(record, id=record_id) for record, record_id in zip(records, ids)])
+    else:
+        ids = [connection.execute(table.insert(), {column: record[column] for column in columns})
+               .inserted_primary_key[0] for record in records]
+    for link in links:
+        value_ids = link.lookup(connection, {value for record in records for value in record[link.field] or ()})
+        rows = [{link.column: record_id, link.value_column: value_ids[value]}
+                for record, record_id in zip(records, ids) for value in record[link.field] or ()]
+        if rows:
+            write_records(connection, link.table, [link.column, link.value_column], rows)
+
+
+def insert_batch(engine, table, columns, batch, links=()):
+    """
+    Inserts a batch of (line, record) pairs in one transaction. Returns the
+    number of inserted rows and a list of (line, error) for rejected rows.
+    """
+    records = [record for _, record in batch]
+    try:
+        with engine.begin() as connection:
+            insert_records(connection, table, columns, records, links)
+        return len(records), []
+    except (DBAPIError, engine.dialect.dbapi.Error):
+        # COPY goes through the raw cursor, its errors are not wrapped
+        pass
+    # isolate the rows the database refused, keeping the rest of the batch
+    inserted, failures = 0, []
+    with engine.begin() as connection:
+        for line, record in batch:
+            savepoint = connection.begin_nested()
+            try:
+                insert_records(connection, table, columns, [record], links)
+                savepoint.commit()
+                inserted += 1
+            except (DBAPIError, engine.dialect.dbapi.Error) as e:
+                savepoint.rollback()
+                failures.append((line, str(getattr(e, 'orig', e)).strip()))
+    return inserted, failures
+
+
+def import_rows(engine, table, form_class, rows, batch_size=5000, report=print, links=()):
+    """
+    Validates and inserts `rows` into `table` in batches of `batch_size`,
+    calling `report` with progress after every batch. Returns the number of
+    inserted rows and a list of (line, error) for every rejected row.
+    """
+    columns = [name for name in form_class(meta={'csrf': False})._fields if name in table.columns]
+    rows = validate(rows, form_class, columns + [link.field for link in links])
+    inserted, failures = 0, []
+    start = time.perf_counter()
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for line, record, errors in chunk:
+            if errors:
+                failures.append((line, errors))
+            else:
+                batch.append((line, record))
+        if batch:
+            count, rejected = insert_batch(engine, table, columns, batch, links)
+            inserted += count
+            failures.extend(rejected)
+        elapsed = time.perf_counter() - start
+        report(f'{inserted} rows imported, {len(failures)} rejected '
+               f'({inserted / elapsed:.0f} rows/s)')
+    return inserted, failures
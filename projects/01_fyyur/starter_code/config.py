@@ -6,6 +6,14 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # Enable debug mode.
 DEBUG = True
 
+# Log file of production workers (debug mode logs to the console): JSON lines,
+# rotated once the file reaches LOG_MAX_BYTES. Records are written by a
+# background thread; beyond LOG_QUEUE_SIZE pending records new ones are dropped.
+LOG_FILE = os.getenv('LOG_FILE', default='error.log')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', default=str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', default='5'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', default='10000'))
+
 # Connect to the database
 
 
@@ -15,5 +23,94 @@ DB_PASSWORD = os.getenv('DB_PASSWORD', default='password')
 DB_NAME = os.getenv('DB_NAME', default='fyyur')
 DB_DOMAIN = os.getenv('DB_DOMAIN', default='localhost')
 DB_PORT = os.getenv('DB_PORT', default='5432')
-SQLALCHEMY_DATABASE_URI = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_DOMAIN}:{DB_PORT}/{DB_NAME}'
+# DATABASE_URL, when set, replaces the DB_* settings above
+SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or \
+    f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_DOMAIN}:{DB_PORT}/{DB_NAME}'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# The schema is managed with `flask db upgrade`. For a throwaway database set
+# SCHEMA_BOOTSTRAP=true to create the missing tables on the first request
+# instead (see models.bootstrap_schema); startup never connects either way.
+SCHEMA_BOOTSTRAP = os.getenv('SCHEMA_BOOTSTRAP', default='false').lower() == 'true'
+
+# Connection pool of every engine (primary and replica). Size the pool to the
+# number of threads of a worker; checkouts wait up to DB_POOL_TIMEOUT seconds
+# for a free connection. DB_STATEMENT_TIMEOUT (milliseconds, 0 disables it)
+# cancels runaway queries server side. Pool usage is reported in the
+# Server-Timing header of every response and at /_metrics (see dbpool.py).
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', default='5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', default='10'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', default='30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', default='1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', default='true').lower() == 'true'
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', default='0'))
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': DB_POOL_SIZE,
+    'max_overflow': DB_MAX_OVERFLOW,
+    'pool_timeout': DB_POOL_TIMEOUT,
+    'pool_recycle': DB_POOL_RECYCLE,
+    'pool_pre_ping': DB_POOL_PRE_PING,
+}
+if DB_STATEMENT_TIMEOUT:
+    SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {
+        'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+    }
+
+# Optional read replica, used by the read only views (see routing.py).
+DB_REPLICA_DOMAIN = os.getenv('DB_REPLICA_DOMAIN')
+DB_REPLICA_PORT = os.getenv('DB_REPLICA_PORT', default=DB_PORT)
+if DB_REPLICA_DOMAIN:
+    SQLALCHEMY_BINDS = {
+        'replica': f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_DOMAIN}:{DB_REPLICA_PORT}/{DB_NAME}'
+    }
+# Seconds a client keeps reading from the primary after writing something.
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', default='5'))
+
+# Content-hashed, precompressed static files written by `flask build-assets`
+# and served with immutable cache headers (see assets.py). Rebuild on deploy.
+ASSETS_BUILD_FOLDER = os.getenv('ASSETS_BUILD_FOLDER', default=os.path.join(basedir, 'build', 'static'))
+
+# Compiled templates (Jinja bytecode), written on first use or ahead of time by
+# `flask compile-templates`, so a new worker does not compile them again.
+# Entries of changed templates are ignored. Set to an empty value to disable.
+TEMPLATE_CACHE_FOLDER = os.getenv('TEMPLATE_CACHE_FOLDER', default=os.path.join(basedir, 'build', 'templates'))
+
+# Stream large listing pages (e.g. /venues) to the client while they render.
+STREAM_TEMPLATES = os.getenv('STREAM_TEMPLATES', default='false').lower() == 'true'
+
+# Number of shows listed per page on /shows.
+SHOWS_PER_PAGE = int(os.getenv('SHOWS_PER_PAGE', default='30'))
+
+# Maximum number of shows listed with one batch request (/shows/create/batch).
+SHOW_BATCH_LIMIT = int(os.getenv('SHOW_BATCH_LIMIT', default='1000'))
+
+# Shows that started more than this many days ago are moved to the ShowArchive
+# table by `flask archive-shows`.
+SHOW_ARCHIVE_AFTER_DAYS = int(os.getenv('SHOW_ARCHIVE_AFTER_DAYS', default='365'))
+
+# Maximum number of venues or artists listed on a search results page.
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', default='50'))
+
+# In-process cache of rendered venue and artist pages: number of entries and
+# seconds before an entry is rendered again.
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', default='1024'))
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', default='60'))
+
+# Part of the ETag of those pages, so a deploy changing the page templates or
+# the built assets invalidates the copies clients hold. Defaults to a digest
+# of the templates and of the assets manifest; set it to a deploy id instead.
+PAGE_VERSION = os.getenv('PAGE_VERSION')
+
+# In-process cache of venues and artists looked up by id (detail pages and
+# edit forms): number of records and seconds before a record is read again.
+# Hits and misses are reported at /_metrics. Set the size to 0 to disable it.
+RECORD_CACHE_SIZE = int(os.getenv('RECORD_CACHE_SIZE', default='10000'))
+RECORD_CACHE_TTL = int(os.getenv('RECORD_CACHE_TTL', default='300'))
+
+# Name autocomplete (/venues/autocomplete, /artists/autocomplete): default
+# number of suggestions, seconds before a worker reloads its in-memory prefix
+# index (writes made through the worker are applied right away), and the
+# table size above which names are looked up in the database instead.
+AUTOCOMPLETE_LIMIT = int(os.getenv('AUTOCOMPLETE_LIMIT', default='10'))
+AUTOCOMPLETE_REFRESH = int(os.getenv('AUTOCOMPLETE_REFRESH', default='300'))
+AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv('AUTOCOMPLETE_MAX_ENTRIES', default='500000'))
@@ -0,0 +1,65 @@
+"""Connection pool telemetry.
+
+TimedQueuePool measures how long every checkout waited for a connection.
+Each request reports its total wait and the number of connections in use
+in a Server-Timing header, and `pool_status` exposes process-wide gauges,
+which together show whether the pool is sized right for the workers.
+"""
+import time
+import threading
+
+from flask import g, has_app_context
+from sqlalchemy.pool import QueuePool
+
+_lock = threading.Lock()
+_totals = {"checkouts": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording the wait of every connection checkout."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            with _lock:
+                _totals["timeouts"] += 1
+            raise
+        record_checkout(self, time.perf_counter() - start)
+        return connection
+
+
+def record_checkout(pool, wait):
+    with _lock:
+        _totals["checkouts"] += 1
+        _totals["wait_seconds"] += wait
+        _totals["max_wait_seconds"] = max(_totals["max_wait_seconds"], wait)
+    if has_app_context():
+        g.pool_wait = g.get('pool_wait', 0.0) + wait
+        g.pool_in_use = max(g.get('pool_in_use', 0), pool.checkedout())
+
+
+def add_server_timing(response):
+    """after_request hook adding the request's pool wait and peak usage."""
+    if 'pool_wait' in g:
+        response.headers.add('Server-Timing', f'db-pool-wait;dur={g.pool_wait * 1000:.2f}')
+        response.headers.add('Server-Timing', f'db-pool-in-use;desc={g.pool_in_use}')
+    return response
+
+
+def pool_status(engines):
+    """Gauges of the given {name: engine} pools and totals since startup."""
+    pools = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            pools[name] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            }
+    with _lock:
+        totals = dict(_totals)
+    return {"pools": pools, "totals": totals}
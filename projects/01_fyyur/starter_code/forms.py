@@ -1,6 +1,6 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, TextAreaField
 from wtforms.validators import DataRequired, AnyOf, URL
 
 class ShowForm(Form):
@@ -16,6 +16,12 @@ class ShowForm(Form):
         default= datetime.today()
     )
 
+class ShowBatchForm(Form):
+    # one "artist_id, venue_id, start_time" line per show
+    shows = TextAreaField(
+        'shows', validators=[DataRequired()]
+    )
+
 class VenueForm(Form):
     name = StringField(
         'name', validators=[DataRequired()]
@@ -1,5 +1,6 @@
 from __future__ import with_statement
 
+import io
 import logging
 from logging.config import fileConfig
 
@@ -7,6 +8,7 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
+from alembic.migration import MigrationContext
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -32,6 +34,18 @@ target_metadata = current_app.extensions['migrate'].db.metadata
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 
+# `flask db upgrade -x online=true` runs every revision in its own
+# transaction and gives up on locks it cannot get within `-x lock_timeout`
+# (5s by default) rather than queueing all queries of the table behind it.
+# `-x dry_run=true` prints the pending statements with the locks they take
+# and how long they are expected to hold them instead of running them, see
+# online_migrations.py.
+x_arguments = context.get_x_argument(as_dictionary=True)
+online = x_arguments.get('online', '').lower() == 'true'
+dry_run = x_arguments.get('dry_run', '').lower() == 'true'
+lock_timeout = x_arguments.get('lock_timeout', '5s')
+scan_mb_per_second = float(x_arguments.get('scan_mb_per_second', 100))
+
 
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
@@ -79,10 +93,16 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
+        if dry_run:
+            run_dry_run(connection)
+            return
+        if online and connection.dialect.name == 'postgresql':
+            connection.execute(f"SET lock_timeout = '{lock_timeout}'")
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            transaction_per_migration=online,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -90,6 +110,30 @@ def run_migrations_online():
             context.run_migrations()
 
 
+def run_dry_run(connection):
+    """Write the SQL of the pending revisions and report their locks."""
+    import online_migrations
+
+    heads = MigrationContext.configure(connection).get_current_heads()
+    buffer = io.StringIO()
+    # revisions querying the database use it, see inspection_bind()
+    config.attributes['dry_run_connection'] = connection
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        as_sql=True,
+        starting_rev=heads[0] if heads else None,
+        output_buffer=buffer,
+        transaction_per_migration=True,
+        **current_app.extensions['migrate'].configure_args
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+    report = online_migrations.lock_report(
+        connection, buffer.getvalue(), scan_mb_per_second)
+    online_migrations.print_lock_report(report)
+
+
 if context.is_offline_mode():
     run_migrations_offline()
 else:
@@ -0,0 +1,33 @@
+"""add full text and genre indexes for /search
+
+Revision ID: 8c41d7e2a9b0
+Revises: 3f9a1c2b7d4e
+Create Date: 2026-10-18 11:03:19.548120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d7e2a9b0'
+down_revision = '3f9a1c2b7d4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the indexed expressions must match search_document() in app.py
+    op.execute('CREATE INDEX "ix_Venue_search" ON "Venue" USING gin '
+               "(to_tsvector('english', name || ' ' || city || ' ' || state))")
+    op.execute('CREATE INDEX "ix_Artist_search" ON "Artist" USING gin '
+               "(to_tsvector('english', name || ' ' || city || ' ' || state))")
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
+    op.drop_index('ix_Artist_search', table_name='Artist')
+    op.drop_index('ix_Venue_search', table_name='Venue')
@@ -0,0 +1,26 @@
+"""delete the shows of an artist in the database
+
+Revision ID: a1d4c7e9f302
+Revises: e5a90d3b6f21
+Create Date: 2026-10-18 15:40:12.208411
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d4c7e9f302'
+down_revision = 'e5a90d3b6f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('Show_artist_id_fkey', 'Show', type_='foreignkey')
+    op.create_foreign_key('Show_artist_id_fkey', 'Show', 'Artist', ['artist_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('Show_artist_id_fkey', 'Show', type_='foreignkey')
+    op.create_foreign_key('Show_artist_id_fkey', 'Show', 'Artist', ['artist_id'], ['id'])
@@ -0,0 +1,74 @@
+"""move genres to a Genre table with VenueGenre and ArtistGenre links
+
+Revision ID: a9c3e5f7d214
+Revises: f2a8c4d61b37
+Create Date: 2026-10-18 20:26:13.870442
+
+The genres arrays of Venue and Artist are copied into the link tables and
+dropped. The (state, city) indexes used by the browse pages are built
+concurrently once the copy is committed, see online_migrations.py.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+import online_migrations
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c3e5f7d214'
+down_revision = 'f2a8c4d61b37'
+branch_labels = None
+depends_on = None
+
+LINKS = (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id'))
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.execute('''
+        INSERT INTO "Genre" (name)
+        SELECT unnest(genres) FROM "Venue"
+        UNION
+        SELECT unnest(genres) FROM "Artist"''')
+    for table, link_table, column in LINKS:
+        op.create_table(link_table,
+        sa.Column(column, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([column], [f'{table}.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(column, 'genre_id')
+        )
+        op.execute(f'''
+            INSERT INTO "{link_table}" ({column}, genre_id)
+            SELECT DISTINCT "{table}".id, "Genre".id
+            FROM "{table}" CROSS JOIN LATERAL unnest("{table}".genres) AS genre(name)
+            JOIN "Genre" ON "Genre".name = genre.name''')
+        op.create_index(f'ix_{link_table}_genre_id_{column}', link_table, ['genre_id', column], unique=False)
+        op.drop_index(f'ix_{table}_genres', table_name=table)
+        op.drop_column(table, 'genres')
+    for table, _, _ in LINKS:
+        online_migrations.create_index_concurrently(f'ix_{table}_state_city', table, ['state', 'city'])
+
+
+def downgrade():
+    for table, _, _ in LINKS:
+        online_migrations.drop_index_concurrently(f'ix_{table}_state_city', table)
+    for table, link_table, column in LINKS:
+        op.add_column(table, sa.Column('genres', postgresql.ARRAY(sa.String(length=120)), nullable=True))
+        op.execute(f'''
+            UPDATE "{table}" SET genres = ARRAY(
+              SELECT "Genre".name FROM "{link_table}"
+              JOIN "Genre" ON "Genre".id = "{link_table}".genre_id
+              WHERE "{link_table}".{column} = "{table}".id
+              ORDER BY "Genre".name)''')
+        op.alter_column(table, 'genres', nullable=False)
+        op.create_index(f'ix_{table}_genres', table, ['genres'], unique=False, postgresql_using='gin')
+        op.drop_table(link_table)
+    op.drop_table('Genre')
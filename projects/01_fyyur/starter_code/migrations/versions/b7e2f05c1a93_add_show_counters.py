@@ -0,0 +1,43 @@
+"""add denormalized past/upcoming show counters to venues and artists
+
+Revision ID: b7e2f05c1a93
+Revises: 8c41d7e2a9b0
+Create Date: 2026-10-18 12:20:07.331802
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f05c1a93'
+down_revision = '8c41d7e2a9b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    # start times are naive local times, compare them with LOCALTIMESTAMP like the app does
+    for table, column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            UPDATE "{table}" SET
+              upcoming_shows_count = counts.upcoming,
+              past_shows_count = counts.past
+            FROM (
+              SELECT {column} AS id,
+                     count(*) FILTER (WHERE start_time > LOCALTIMESTAMP) AS upcoming,
+                     count(*) FILTER (WHERE start_time <= LOCALTIMESTAMP) AS past
+              FROM "Show"
+              GROUP BY {column}
+            ) AS counts
+            WHERE "{table}".id = counts.id
+        ''')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
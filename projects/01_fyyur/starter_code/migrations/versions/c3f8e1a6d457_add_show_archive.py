@@ -0,0 +1,35 @@
+"""add ShowArchive table for archived past shows
+
+Revision ID: c3f8e1a6d457
+Revises: a1d4c7e9f302
+Create Date: 2026-10-18 16:55:41.730925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8e1a6d457'
+down_revision = 'a1d4c7e9f302'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowArchive',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'venue_id', 'start_time')
+    )
+    op.create_index('ix_ShowArchive_venue_id_start_time', 'ShowArchive', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_ShowArchive_artist_id_start_time', 'ShowArchive', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ShowArchive_artist_id_start_time', table_name='ShowArchive')
+    op.drop_index('ix_ShowArchive_venue_id_start_time', table_name='ShowArchive')
+    op.drop_table('ShowArchive')
@@ -0,0 +1,92 @@
+"""partition Show by month of start_time
+
+Revision ID: d7b2e4f91c68
+Revises: c3f8e1a6d457
+Create Date: 2026-10-18 18:12:09.514362
+
+The table is rebuilt: the existing shows are copied into a new partitioned
+Show table, with one partition per month from the oldest show to a year
+ahead, and the old table is dropped. The primary key gains start_time, which
+Postgres requires of a partitioned table. Needs Postgres 11 or later. When
+only writing SQL (--sql) the oldest show is unknown: partitions start with
+the current month and older shows go to Show_default.
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+import partitions
+from online_migrations import inspection_bind
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b2e4f91c68'
+down_revision = 'c3f8e1a6d457'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_Show_venue_id_start_time': ['venue_id', 'start_time'],
+    'ix_Show_artist_id_start_time': ['artist_id', 'start_time'],
+    'ix_Show_start_time': ['start_time', 'artist_id', 'venue_id'],
+}
+
+
+def rename_old_table():
+    op.rename_table('Show', 'Show_old')
+    op.execute('ALTER TABLE "Show_old" RENAME CONSTRAINT "Show_pkey" TO "Show_old_pkey"')
+    for name in INDEXES:
+        op.drop_index(name, table_name='Show_old')
+
+
+def create_show_table(primary_key, start_time_nullable, **kw):
+    op.create_table('Show',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=start_time_nullable),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint(*primary_key, name='Show_pkey'),
+    **kw
+    )
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'Show', columns, unique=False)
+
+
+def upgrade():
+    oldest = None
+    inspection = inspection_bind()
+    if inspection is not None:
+        undated = inspection.execute(sa.text('SELECT count(*) FROM "Show" WHERE start_time IS NULL')).scalar()
+        if undated:
+            raise RuntimeError(f'{undated} shows have no start time, set or delete them before partitioning')
+        oldest = inspection.execute(sa.text('SELECT min(start_time) FROM "Show"')).scalar()
+    connection = op.get_bind()
+
+    rename_old_table()
+    create_show_table(['artist_id', 'venue_id', 'start_time'], False,
+                      postgresql_partition_by='RANGE (start_time)')
+    partitions.create_default_partition(connection)
+    now = datetime.datetime.now()
+    first_month = min(oldest or now, now)
+    months = (now.year - first_month.year) * 12 + now.month - first_month.month + 12
+    # Show was just created, it has no partitions besides the default one
+    partitions.create_show_partitions(connection, first_month, months, existing=set())
+    op.execute('''
+        INSERT INTO "Show" (artist_id, venue_id, start_time)
+        SELECT artist_id, venue_id, start_time FROM "Show_old"''')
+    op.drop_table('Show_old')
+
+
+def downgrade():
+    # fails if an artist has several shows at the same venue, which the old
+    # primary key does not allow
+    rename_old_table()
+    create_show_table(['artist_id', 'venue_id'], True)
+    op.execute('''
+        INSERT INTO "Show" (artist_id, venue_id, start_time)
+        SELECT artist_id, venue_id, start_time FROM "Show_old"''')
+    # drops the partitions along with their parent
+    op.drop_table('Show_old')
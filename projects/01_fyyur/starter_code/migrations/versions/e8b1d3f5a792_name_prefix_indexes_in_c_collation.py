@@ -0,0 +1,38 @@
+"""name prefix indexes in the C collation
+
+Revision ID: e8b1d3f5a792
+Revises: a9c3e5f7d214
+Create Date: 2026-10-18 23:05:37.640118
+
+The text_pattern_ops indexes served `lower(name) LIKE 'prefix%'` but not the
+ORDER BY of the autocomplete queries, which sorted every match before the
+LIMIT. Indexes on `lower(name) COLLATE "C", id` serve both. The new indexes
+are built concurrently before the old ones are dropped, see
+online_migrations.py.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import online_migrations
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b1d3f5a792'
+down_revision = 'a9c3e5f7d214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        online_migrations.create_index_concurrently(
+            f'ix_{table}_name_prefix_c', table, [sa.text('lower(name) COLLATE "C"'), 'id'])
+        online_migrations.drop_index_concurrently(f'ix_{table}_name_prefix', table)
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        online_migrations.create_index_concurrently(
+            f'ix_{table}_name_prefix', table, [sa.text('lower(name) text_pattern_ops')])
+        online_migrations.drop_index_concurrently(f'ix_{table}_name_prefix_c', table)
@@ -0,0 +1,31 @@
+"""name prefix indexes for autocomplete
+
+Revision ID: f2a8c4d61b37
+Revises: d7b2e4f91c68
+Create Date: 2026-10-18 19:40:51.208317
+
+Built concurrently, see online_migrations.py.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import online_migrations
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8c4d61b37'
+down_revision = 'd7b2e4f91c68'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        online_migrations.create_index_concurrently(
+            f'ix_{table}_name_prefix', table, [sa.text('lower(name) text_pattern_ops')])
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        online_migrations.drop_index_concurrently(f'ix_{table}_name_prefix', table)
@@ -0,0 +1,265 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import sqlite3
+import datetime
+import threading
+from sqlalchemy import event, DDL
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.associationproxy import association_proxy
+from forms import VenueForm
+from routing import RoutingSQLAlchemy
+import partitions
+
+# bound to the app by create_app(), see app.py; read only views use the
+# replica bind when one is configured, see routing.py
+db = RoutingSQLAlchemy()
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+# name searches are served by pg_trgm GIN indexes on Postgres
+event.listen(
+  db.metadata, 'before_create',
+  DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# deletes rely on ON DELETE CASCADE, which SQLite (e.g. TEST_DATABASE_URL)
+# only enforces with foreign_keys on
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(connection, connection_record):
+  if isinstance(connection, sqlite3.Connection):
+    connection.execute('PRAGMA foreign_keys=ON')
+
+GENRES = [genre for genre, _ in VenueForm.genres.kwargs['choices']]
+
+class Genre(db.Model):
+  '''
+  Genres of venues and artists, linked through VenueGenre and ArtistGenre.
+  Both link tables are indexed both ways, (entity, genre) as primary key and
+  (genre, entity) for listing the venues or artists of a genre.
+  '''
+  __tablename__ = 'Genre'
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(120), nullable=False, unique=True)
+
+  def __repr__(self):
+    return f'<Genre ID: {self.id}, name: {self.name}>'
+
+  @classmethod
+  def named(cls, name):
+    # creator of the genres association proxies: reuses the row of a known genre
+    with db.session.no_autoflush:
+      genre = cls.query.filter_by(name=name).first()
+    return genre or cls(name=name)
+
+@event.listens_for(Genre.__table__, 'after_create')
+def create_genres(target, connection, **kw):
+  connection.execute(target.insert(), [{"name": genre} for genre in GENRES])
+
+def genre_links(table_name, column, referent):
+  return db.Table(
+    table_name,
+    db.Column(column, db.Integer, db.ForeignKey(f'{referent}.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index(f'ix_{table_name}_genre_id_{column}', 'genre_id', column),
+  )
+
+venue_genres = genre_links('VenueGenre', 'venue_id', 'Venue')
+artist_genres = genre_links('ArtistGenre', 'artist_id', 'Artist')
+
+# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+class Venue(db.Model):
+  __tablename__ = 'Venue'
+  # the full text index used by /search lives in migration 8c41d7e2a9b0
+  __table_args__ = (
+    db.Index('ix_Venue_name_trgm', 'name',
+             postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_Venue_state_city', 'state', 'city'),
+  )
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String, nullable=False)
+  city = db.Column(db.String(120), nullable=False)
+  state = db.Column(db.String(120), nullable=False)
+  address = db.Column(db.String(120), nullable=False)
+  phone = db.Column(db.String(120))
+  image_link = db.Column(db.String(500))
+  facebook_link = db.Column(db.String(120))
+
+  # TODO: implement any missing fields, as a database migration using Flask-Migrate
+  # genre names, stored in VenueGenre
+  genre_records = db.relationship(Genre, secondary=venue_genres, lazy='joined', order_by=Genre.name)
+  genres = association_proxy('genre_records', 'name', creator=Genre.named)
+  website = db.Column(db.String(120))
+  seeking_venue = db.Column(db.Boolean, default=False)
+  seeking_description = db.Column(db.String(500))
+  # denormalized from Show and ShowArchive, see refresh_show_counters()
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+  def __repr__(self):
+    return f'<Venue ID: {self.id}, name: {self.name}>'
+
+  def to_dict(self):
+    return {
+      "id": self.id,
+      "name": self.name,          
+      "city": self.city,         
+      "state": self.state, 
+      "address": self.address,            
+      "phone": self.phone,      
+      "genres": list(self.genres),
+      "image_link": self.image_link,
+      "facebook_link": self.facebook_link,     
+      "website": self.website,        
+      "seeking_venue": self.seeking_venue,
+      "seeking_description": self.seeking_description
+    }
+
+
+class Artist(db.Model):
+  __tablename__ = 'Artist'
+  # the full text index used by /search lives in migration 8c41d7e2a9b0
+  __table_args__ = (
+    db.Index('ix_Artist_name_trgm', 'name',
+             postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_Artist_state_city', 'state', 'city'),
+  )
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String, nullable=False)
+  city = db.Column(db.String(120), nullable=False)
+  state = db.Column(db.String(120), nullable=False)
+  phone = db.Column(db.String(120))
+  # genre names, stored in ArtistGenre
+  genre_records = db.relationship(Genre, secondary=artist_genres, lazy='joined', order_by=Genre.name)
+  genres = association_proxy('genre_records', 'name', creator=Genre.named)
+  image_link = db.Column(db.String(500))
+  facebook_link = db.Column(db.String(120))
+  # TODO: implement any missing fields, as a database migration using Flask-Migrate
+  website = db.Column(db.String(120))
+  seeking_venue = db.Column(db.Boolean, default=False)
+  seeking_description = db.Column(db.String(500))
+  # denormalized from Show and ShowArchive, see refresh_show_counters()
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  # read only shortcut through Show; shows are written through the Shows model
+  venues = db.relationship('Venue', 
+                            secondary='Show',
+                            backref=db.backref("artists", viewonly=True, sync_backref=False),
+                            viewonly=True,
+                            sync_backref=False)
+
+  def __repr__(self):
+    return f'<Artist ID: {self.id}, name: {self.name}>'
+
+  def to_dict(self):
+    return {
+      "id": self.id,
+      "name": self.name,          
+      "city": self.city,         
+      "state": self.state,             
+      "phone": self.phone,      
+      "genres": list(self.genres),
+      "image_link": self.image_link,
+      "facebook_link": self.facebook_link,     
+      "website": self.website,        
+      "seeking_venue": self.seeking_venue,
+      "seeking_description": self.seeking_description
+    }
+
+
+class Shows(db.Model):
+  __tablename__ = 'Show'
+  # on Postgres one partition per month of start_time, see partitions.py. The
+  # partition key has to be part of the primary key, so an artist can play a
+  # venue several times.
+  __table_args__ = (
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Show_start_time', 'start_time', 'artist_id', 'venue_id'),
+    {'postgresql_partition_by': 'RANGE (start_time)'},
+  )
+
+  artist_id = db.Column(
+    db.Integer, 
+    db.ForeignKey('Artist.id', ondelete="CASCADE"), 
+    primary_key=True)
+  venue_id = db.Column(
+    db.Integer, 
+    db.ForeignKey('Venue.id', ondelete="CASCADE"), 
+    primary_key=True)
+  start_time = db.Column(db.DateTime, primary_key=True, default=datetime.datetime.utcnow)
+  # the database deletes the shows of a deleted venue or artist (ON DELETE
+  # CASCADE), passive_deletes keeps SQLAlchemy from loading them first
+  artist = db.relationship(Artist, backref=db.backref("shows", passive_deletes=True))
+  venue = db.relationship(Venue, backref=db.backref("shows", passive_deletes=True))
+
+@event.listens_for(Shows.__table__, 'after_create')
+def create_show_partitions(target, connection, **kw):
+  # a new partitioned Show table gets its default partition and the coming year
+  if connection.dialect.name == 'postgresql':
+    partitions.create_default_partition(connection)
+    partitions.create_show_partitions(connection, datetime.datetime.now(), 12)
+
+
+class ShowArchive(db.Model):
+  '''
+  Shows older than SHOW_ARCHIVE_AFTER_DAYS, moved out of Show by the
+  archive-shows command. Only the history section of venue and artist pages
+  reads them. A pair can be archived more than once, so the start time is
+  part of the key.
+  '''
+  __tablename__ = 'ShowArchive'
+  __table_args__ = (
+    db.Index('ix_ShowArchive_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_ShowArchive_artist_id_start_time', 'artist_id', 'start_time'),
+  )
+
+  artist_id = db.Column(
+    db.Integer, 
+    db.ForeignKey('Artist.id', ondelete="CASCADE"), 
+    primary_key=True)
+  venue_id = db.Column(
+    db.Integer, 
+    db.ForeignKey('Venue.id', ondelete="CASCADE"), 
+    primary_key=True)
+  start_time = db.Column(db.DateTime, primary_key=True)
+
+# name lookups by prefix (the autocomplete endpoints) compare `lower(name)` in
+# the C collation: the index then serves `LIKE 'prefix%'` and returns the
+# matches in order of name and id, so a LIMIT stops the scan early on Postgres
+for model in (Venue, Artist):
+  event.listen(
+    model.__table__, 'after_create',
+    DDL(f'CREATE INDEX "ix_{model.__tablename__}_name_prefix_c" '
+        f'ON "{model.__tablename__}" (lower(name) COLLATE "C", id)').execute_if(dialect='postgresql'))
+
+#----------------------------------------------------------------------------#
+# Schema.
+#----------------------------------------------------------------------------#
+
+def bootstrap_schema(app):
+  '''
+  Creates the missing tables of the primary database before the first
+  request, for databases not managed with `flask db upgrade` (opt in with
+  SCHEMA_BOOTSTRAP). Nothing runs at startup, so a worker starts even while
+  the database is unreachable; the request then fails and the next one tries
+  again.
+  '''
+  lock = threading.Lock()
+  done = False
+
+  def create_missing_tables():
+    nonlocal done
+    if done:
+      return
+    with lock:
+      if not done:
+        db.create_all(bind=None, app=app)
+        done = True
+
+  app.before_request(create_missing_tables)
@@ -0,0 +1,223 @@
+"""Helpers for schema migrations that keep the tables available.
+
+Plain Alembic operations take an ACCESS EXCLUSIVE lock for as long as
+Postgres needs to scan or rewrite the table, e.g. `alter_column(...,
+nullable=False)` on millions of rows blocks every query on it until the
+check is done. The helpers below do the same changes in steps that only
+hold short locks:
+
+* `create_index_concurrently` / `drop_index_concurrently`
+* `add_foreign_key_not_valid` / `add_check_not_valid` followed by
+  `validate_constraint`, which checks existing rows without blocking writes
+* `set_not_null`, which goes through a validated CHECK constraint so that
+  SET NOT NULL does not scan the table (Postgres 12+)
+* `backfill`, which updates rows in batches, each committed on its own
+
+Revisions using them should run with `flask db upgrade -x online=true`
+(see migrations/env.py): every revision then runs in its own transaction
+with a lock_timeout, so a migration waiting for a lock fails fast instead
+of queueing every query behind it. `-x dry_run=true` prints the statements
+of the pending revisions with the lock each one takes and an estimate of
+how long it holds it, without changing anything (see `lock_report`).
+"""
+import re
+
+from alembic import op
+from sqlalchemy import text
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _columns(columns):
+    return ', '.join(_quote(column) for column in columns)
+
+
+def _offline():
+    return op.get_context().as_sql
+
+
+def inspection_bind():
+    """
+    Connection for the queries a revision runs to decide what to do, e.g.
+    counting rows. Under `-x dry_run=true` op.get_bind() only writes SQL out,
+    so they run on the connection env.py passes in `dry_run_connection`
+    instead. None when only writing SQL (`flask db upgrade --sql`).
+    """
+    config = op.get_context().config
+    connection = config.attributes.get('dry_run_connection') if config else None
+    if connection is not None:
+        return connection
+    return None if _offline() else op.get_bind()
+
+
+def create_index_concurrently(name, table, columns, **kw):
+    """
+    CREATE INDEX CONCURRENTLY, which lets reads and writes go on while the
+    index builds. It cannot run in a transaction, so the revision's
+    transaction is committed first. A build that failed before leaves an
+    invalid index behind; it is dropped and built again.
+    """
+    with op.get_context().autocommit_block():
+        if not _offline():
+            invalid = op.get_bind().execute(text('''
+                SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+                WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'''), name=name).scalar()
+            if invalid:
+                op.execute(f'DROP INDEX CONCURRENTLY {_quote(name)}')
+        op.create_index(name, table, columns, postgresql_concurrently=True, **kw)
+
+
+def drop_index_concurrently(name, table):
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def add_foreign_key_not_valid(name, source, referent, local_columns, remote_columns, ondelete=None):
+    """
+    Adds a foreign key that is only enforced for new rows. Existing rows are
+    checked by `validate_constraint`, in a later step or revision.
+    """
+    on_delete = f' ON DELETE {ondelete}' if ondelete else ''
+    op.execute(
+        f'ALTER TABLE {_quote(source)} ADD CONSTRAINT {_quote(name)} '
+        f'FOREIGN KEY ({_columns(local_columns)}) '
+        f'REFERENCES {_quote(referent)} ({_columns(remote_columns)}){on_delete} NOT VALID')
+
+
+def add_check_not_valid(name, table, condition):
+    op.execute(f'ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(name)} CHECK ({condition}) NOT VALID')
+
+
+def validate_constraint(table, name):
+    """
+    Checks the existing rows against a NOT VALID constraint. Only takes a
+    SHARE UPDATE EXCLUSIVE lock, so reads and writes go on meanwhile; the
+    transaction is committed first so no earlier lock is held during the scan.
+    """
+    with op.get_context().autocommit_block():
+        op.execute(f'ALTER TABLE {_quote(table)} VALIDATE CONSTRAINT {_quote(name)}')
+
+
+def set_not_null(table, column):
+    """
+    Online version of alter_column(table, column, nullable=False): a valid
+    CHECK (column IS NOT NULL) lets SET NOT NULL skip its table scan.
+    """
+    check = f'{table}_{column}_not_null'
+    add_check_not_valid(check, table, f'{_quote(column)} IS NOT NULL')
+    validate_constraint(table, check)
+    op.alter_column(table, column, nullable=False)
+    op.drop_constraint(check, table, type_='check')
+
+
+def backfill(table, assignments, where, key='id', batch_size=10000, params=None):
+    """
+    Runs UPDATE table SET <assignments> WHERE <where> in batches of
+    `batch_size` rows picked by `key`, committing after every batch so row
+    locks are held briefly. `where` must stop matching a row once it has been
+    updated, e.g. `website IS NULL` for `website = ''`. Returns the number of
+    updated rows (None when only generating SQL).
+    """
+    statement = (
+        f'UPDATE {_quote(table)} SET {assignments} WHERE {_quote(key)} IN ('
+        f'SELECT {_quote(key)} FROM {_quote(table)} WHERE {where} LIMIT {int(batch_size)})')
+    with op.get_context().autocommit_block():
+        if _offline():
+            op.execute(f'-- repeated until no row is updated\n{statement}')
+            return None
+        updated = 0
+        while True:
+            count = op.get_bind().execute(text(statement), **(params or {})).rowcount
+            updated += count
+            if count < batch_size:
+                return updated
+
+
+# Lock taken by each kind of statement, whether it waits for a scan or a
+# rewrite of the table while holding it, and whether it blocks reads/writes.
+# Matched in order against the statement.
+LOCKS = [
+    (r'^CREATE\s+(UNIQUE\s+)?INDEX\s+CONCURRENTLY', 'SHARE UPDATE EXCLUSIVE', 'scan', ''),
+    (r'^DROP\s+INDEX\s+CONCURRENTLY', 'SHARE UPDATE EXCLUSIVE', None, ''),
+    (r'^CREATE\s+(UNIQUE\s+)?INDEX', 'SHARE', 'scan', 'writes'),
+    (r'^DROP\s+INDEX', 'ACCESS EXCLUSIVE', None, 'reads and writes'),
+    (r'^ALTER\s+TABLE.*\bVALIDATE\s+CONSTRAINT', 'SHARE UPDATE EXCLUSIVE', 'scan', ''),
+    (r'^ALTER\s+TABLE.*\bNOT\s+VALID\s*$', 'ACCESS EXCLUSIVE', None, 'reads and writes'),
+    (r'^ALTER\s+TABLE.*\bADD\s+CONSTRAINT.*\bFOREIGN\s+KEY', 'SHARE ROW EXCLUSIVE', 'scan', 'writes'),
+    (r'^ALTER\s+TABLE.*\bADD\s+CONSTRAINT', 'ACCESS EXCLUSIVE', 'scan', 'reads and writes'),
+    (r'^ALTER\s+TABLE.*\bTYPE\b', 'ACCESS EXCLUSIVE', 'rewrite', 'reads and writes'),
+    (r'^ALTER\s+TABLE.*\bSET\s+NOT\s+NULL', 'ACCESS EXCLUSIVE', 'scan', 'reads and writes'),
+    (r'^ALTER\s+TABLE.*\bADD\s+(COLUMN\s+)?\S+\s+.*\bDEFAULT\s+[a-z_]+\(', 'ACCESS EXCLUSIVE', 'rewrite', 'reads and writes'),
+    (r'^ALTER\s+TABLE', 'ACCESS EXCLUSIVE', None, 'reads and writes'),
+    (r'^(UPDATE|DELETE|INSERT)', 'ROW EXCLUSIVE', 'scan', 'conflicting row writes'),
+    (r'^(CREATE|DROP)\s+TABLE', 'ACCESS EXCLUSIVE', None, ''),
+]
+
+NOT_NULL_CHECK = re.compile(r'ADD\s+CONSTRAINT\s+"?(\w+)"?\s+CHECK\s+\("?(\w+)"?\s+IS\s+NOT\s+NULL\)', re.I)
+VALIDATE = re.compile(r'VALIDATE\s+CONSTRAINT\s+"?(\w+)"?', re.I)
+SET_NOT_NULL = re.compile(r'ALTER\s+COLUMN\s+"?(\w+)"?\s+SET\s+NOT\s+NULL', re.I)
+# relations named by a statement, the first one being the one it changes
+RELATION = re.compile(
+    r'(?:^DROP\s+INDEX(?:\s+CONCURRENTLY)?|\b(?:TABLE|ON|UPDATE|FROM|INTO|JOIN))'
+    r'\s+(?:ONLY\s+)?(?:IF\s+(?:NOT\s+)?EXISTS\s+)?("[^"]+"|\w+)', re.I)
+
+
+def split_statements(sql):
+    """Splits the SQL script written by Alembic into its statements."""
+    statements = []
+    for statement in sql.split(';\n'):
+        lines = [line for line in statement.splitlines() if line.strip() and not line.startswith('--')]
+        if lines:
+            statements.append(' '.join(line.strip() for line in lines))
+    return statements
+
+
+def lock_report(connection, sql, scan_mb_per_second=100):
+    """
+    Estimates the locks taken by the statements of an Alembic SQL script.
+    Scans and rewrites are estimated from the size of the largest relation
+    the statement names (e.g. the source of an INSERT ... SELECT) at
+    `scan_mb_per_second` (Postgres only, 0 elsewhere). Returns (statement,
+    table, lock, seconds, blocks) tuples, seconds being None for locks held
+    only briefly. SET NOT NULL is taken to be brief after a validated
+    `CHECK (column IS NOT NULL)` in the same script, see `set_not_null`.
+    """
+    report = []
+    checks, checked = {}, set()
+    for statement in split_statements(sql):
+        if statement.upper().startswith(('BEGIN', 'COMMIT', 'SET ')) or 'alembic_version' in statement:
+            continue
+        relations = [name.strip('"') for name in RELATION.findall(statement)]
+        table = relations[0] if relations else None
+        for pattern, lock, work, blocks in LOCKS:
+            if re.search(pattern, statement, re.I | re.S):
+                break
+        else:
+            lock, work, blocks = None, None, ''
+        if match := NOT_NULL_CHECK.search(statement):
+            checks[match.group(1)] = (table, match.group(2))
+        elif (match := VALIDATE.search(statement)) and match.group(1) in checks:
+            checked.add(checks[match.group(1)])
+        elif (match := SET_NOT_NULL.search(statement)) and (table, match.group(1)) in checked:
+            work = None
+        seconds = None
+        if work and table:
+            size = 0
+            if connection.dialect.name == 'postgresql':
+                size = max(connection.execute(text(
+                    'SELECT pg_total_relation_size(to_regclass(:relation))'),
+                    relation=_quote(relation)).scalar() or 0 for relation in relations)
+            seconds = size / (scan_mb_per_second * 1024 * 1024)
+        report.append((statement, table, lock, seconds, blocks))
+    return report
+
+
+def print_lock_report(report, echo=print):
+    for statement, table, lock, seconds, blocks in report:
+        echo(statement[:160] + ('...' if len(statement) > 160 else ''))
+        if lock:
+            held = 'briefly' if seconds is None else f'~{seconds:.1f}s'
+            blocking = f', blocks {blocks}' if blocks else ''
+            echo(f'    {lock} lock on {table} held {held}{blocking}')
@@ -0,0 +1,81 @@
+"""Monthly partitions of the Show table (Postgres only).
+
+Show is partitioned by range on start_time, one partition per calendar month
+named Show_pYYYY_MM, plus Show_default for anything outside of them. Queries
+bounded by start_time, like the upcoming shows of a venue, only scan the
+months they cover, and a month that is no longer needed can be detached
+without rewriting the rest of the table.
+
+Partitions have to exist before shows for their month arrive, otherwise the
+shows land in Show_default. `create_show_partitions` creates them ahead of
+time; run `flask create-show-partitions` monthly.
+"""
+import datetime
+
+from sqlalchemy import text
+
+PARENT = 'Show'
+DEFAULT_PARTITION = 'Show_default'
+
+
+def month_start(day):
+    return datetime.datetime(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT}_p{month:%Y_%m}'
+
+
+def existing_partitions(connection):
+    return {name for (name,) in connection.execute(text('''
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :parent'''), parent=PARENT)}
+
+
+def create_default_partition(connection):
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{PARENT}" DEFAULT'))
+
+
+def create_show_partitions(connection, first_month, months, existing=None):
+    """
+    Creates the monthly partitions of Show for `months` months starting with
+    the month of `first_month`, skipping the ones that exist. Shows of those
+    months already stored in Show_default are moved into the new partition.
+    Returns the names of the partitions created. `existing` spares the lookup
+    of the partitions, e.g. when Show was just created.
+    """
+    if existing is None:
+        existing = existing_partitions(connection)
+    created = []
+    month = month_start(first_month)
+    for _ in range(months):
+        name, next_month = partition_name(month), add_months(month, 1)
+        if name not in existing:
+            bounds = {"start": month, "end": next_month}
+            # created detached, so the rows of the month can leave the default
+            # partition before the new one is attached
+            connection.execute(text(
+                f'CREATE TABLE "{name}" (LIKE "{PARENT}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+            if DEFAULT_PARTITION in existing:
+                connection.execute(text(f'''
+                    WITH moved AS (
+                      DELETE FROM "{DEFAULT_PARTITION}"
+                      WHERE start_time >= :start AND start_time < :end
+                      RETURNING artist_id, venue_id, start_time)
+                    INSERT INTO "{name}" (artist_id, venue_id, start_time)
+                    SELECT artist_id, venue_id, start_time FROM moved'''), bounds)
+            # indexes, primary key and foreign keys of Show are added on attach
+            connection.execute(text(
+                f'ALTER TABLE "{PARENT}" ATTACH PARTITION "{name}" '
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"))
+            created.append(name)
+        month = next_month
+    return created
@@ -0,0 +1,68 @@
+"""Routing of read only views to a replica database.
+
+A replica is configured as the `replica` entry of SQLALCHEMY_BINDS. Views
+decorated with `read_only` send their queries there, except for clients
+that wrote something less than READ_YOUR_WRITES_SECONDS ago: those keep
+reading from the primary so they always see their own changes.
+"""
+import time
+import functools
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+
+REPLICA = 'replica'
+
+
+def replica_configured(app):
+    return REPLICA in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def read_bind():
+    """
+    REPLICA when the queries of the current request go to the replica, None
+    for the primary. Caches filled from query results include it in their
+    keys: an entry read from a lagging replica must not be served to a
+    client that reads its own writes from the primary.
+    """
+    if has_app_context() and g.get('use_replica') and replica_configured(current_app):
+        return REPLICA
+    return None
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_app_context() and g.get('use_replica') \
+                and replica_configured(self.app):
+            return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def read_only(view):
+    """Marks a view as read only, routing its queries to the replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = time.time() >= session.get('primary_until', 0)
+        return view(*args, **kwargs)
+    wrapper.read_only = True
+    return wrapper
+
+
+def stick_to_primary(response):
+    """
+    after_request hook: once a client has written something, its reads go
+    to the primary for the next READ_YOUR_WRITES_SECONDS.
+    """
+    view = current_app.view_functions.get(request.endpoint)
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 \
+            and view is not None and not getattr(view, 'read_only', False):
+        session['primary_until'] = time.time() + current_app.config['READ_YOUR_WRITES_SECONDS']
+    return response
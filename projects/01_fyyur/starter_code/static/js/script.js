@@ -2,3 +2,32 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Inputs with data-autocomplete="<url>" suggest records as the user types:
+// the names matching the typed prefix are fetched from <url>?q= and offered
+// through the input's datalist, with the record id as the value.
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var timer = null;
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    var prefix = input.value.trim();
+    if (!prefix || /^\d+$/.test(prefix)) {
+      return;
+    }
+    timer = setTimeout(function () {
+      fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(prefix))
+        .then(function (response) { return response.json(); })
+        .then(function (body) {
+          list.innerHTML = '';
+          body.data.forEach(function (record) {
+            var option = document.createElement('option');
+            option.value = record.id;
+            option.label = record.name;
+            option.textContent = record.name;
+            list.appendChild(option);
+          });
+        });
+    }, 150);
+  });
+});
@@ -0,0 +1,181 @@
+"""Seeded synthetic venues, artists and shows for local load tests.
+
+Records have the shape of the forms in forms.py and are written through
+bulk_import, so a few million rows load in minutes. The same seed always
+produces the same data. Like production, the data is skewed rather than
+uniform:
+
+* venues and artists are spread over cities with Zipf-like weights, so a
+  handful of big cities hold most of them
+* popularity follows a Zipf law too: the busiest venues and artists get
+  orders of magnitude more shows than the long tail
+* genres are weighted, with the most common ones on most records
+* shows are spread from a year ago to six months ahead, mostly in the
+  evening and more of them on weekends
+"""
+import random
+import datetime
+from itertools import islice
+
+from forms import VenueForm
+import bulk_import
+
+GENRES = [genre for genre, _ in VenueForm.genres.kwargs['choices']]
+# biggest first, weighted by rank
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+    ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+    ('Dallas', 'TX'), ('Austin', 'TX'), ('San Francisco', 'CA'), ('Seattle', 'WA'),
+    ('Denver', 'CO'), ('Nashville', 'TN'), ('Boston', 'MA'), ('Portland', 'OR'),
+    ('Las Vegas', 'NV'), ('Detroit', 'MI'), ('Memphis', 'TN'), ('Atlanta', 'GA'),
+    ('Miami', 'FL'), ('Minneapolis', 'MN'), ('New Orleans', 'LA'), ('Cleveland', 'OH'),
+    ('Kansas City', 'MO'), ('Buffalo', 'NY'), ('Santa Fe', 'NM'), ('Asheville', 'NC'),
+]
+ADJECTIVES = [
+    'Blue', 'Golden', 'Velvet', 'Electric', 'Crimson', 'Silver', 'Midnight', 'Wild',
+    'Broken', 'Lucky', 'Hollow', 'Neon', 'Rusty', 'Quiet', 'Northern', 'Cosmic',
+]
+NOUNS = [
+    'Note', 'Room', 'Lantern', 'Owl', 'Anchor', 'Garden', 'Harbor', 'Crow',
+    'Mirror', 'Engine', 'Canyon', 'Tide', 'Fox', 'Signal', 'Orchard', 'Comet',
+]
+# shows start on one of these days (relative to now) at one of these hours,
+# the evening ones more often
+SHOW_DAYS = range(-365, 183)
+SHOW_HOURS = (18, 19, 20, 20, 21, 21, 22)
+VENUE_KINDS = ['Hall', 'Club', 'Lounge', 'Theater', 'Tavern', 'Ballroom', 'Bar', 'Loft']
+STREETS = ['Main St', 'Broadway', 'Market St', 'Oak Ave', 'Mission St', '2nd Ave', 'Elm St']
+
+
+def zipf_weights(count, exponent=1.1):
+    """Cumulative Zipf weights of `count` ranks, for random.choices."""
+    weights, total = [], 0.0
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+def made_up_name(rnd, kinds=None):
+    words = [rnd.choice(ADJECTIVES), rnd.choice(NOUNS)]
+    if kinds:
+        words.append(rnd.choice(kinds))
+    return ' '.join(words)
+
+
+def base_record(rnd, city_weights, genre_weights):
+    city, state = rnd.choices(CITIES, cum_weights=city_weights)[0]
+    seeking = rnd.random() < 0.3
+    return {
+        "city": city,
+        "state": state,
+        "phone": f'{rnd.randint(200, 999)}-{rnd.randint(200, 999)}-{rnd.randint(0, 9999):04d}',
+        "genres": sorted(set(rnd.choices(GENRES, cum_weights=genre_weights, k=rnd.choice((1, 1, 2, 2, 3))))),
+        "image_link": None,
+        "facebook_link": None,
+        "website": None,
+        "seeking_venue": seeking,
+        "seeking_description": 'Looking for new acts to book.' if seeking else None,
+    }
+
+
+def venues(rnd, count):
+    city_weights, genre_weights = zipf_weights(len(CITIES)), zipf_weights(len(GENRES), 0.8)
+    for number in range(1, count + 1):
+        record = base_record(rnd, city_weights, genre_weights)
+        record["name"] = f'{made_up_name(rnd, VENUE_KINDS)} {number}'
+        record["address"] = f'{rnd.randint(1, 9999)} {rnd.choice(STREETS)}'
+        yield record
+
+
+def artists(rnd, count):
+    city_weights, genre_weights = zipf_weights(len(CITIES)), zipf_weights(len(GENRES), 0.8)
+    for number in range(1, count + 1):
+        record = base_record(rnd, city_weights, genre_weights)
+        record["name"] = f'The {made_up_name(rnd)}s {number}'
+        yield record
+
+
+def max_shows(venue_count, artist_count):
+    """Number of distinct shows `shows` can draw between that many venues and artists."""
+    return venue_count * artist_count * len(SHOW_DAYS) * len(set(SHOW_HOURS))
+
+
+def shows(rnd, count, venue_ids, artist_ids, now):
+    """
+    Yields `count` distinct shows between the given venues and artists, each
+    drawn with Zipf weights over a shuffled ranking so the popular ones are
+    spread over the id range. Raises ValueError when there are fewer than
+    `count` distinct shows to draw.
+    """
+    venue_ids, artist_ids = list(venue_ids), list(artist_ids)
+    if count > max_shows(len(venue_ids), len(artist_ids)):
+        raise ValueError(f'{len(venue_ids)} venues and {len(artist_ids)} artists have at most '
+                         f'{max_shows(len(venue_ids), len(artist_ids))} distinct shows, not {count}')
+    rnd.shuffle(venue_ids)
+    rnd.shuffle(artist_ids)
+    venue_weights, artist_weights = zipf_weights(len(venue_ids)), zipf_weights(len(artist_ids))
+    seen = set()
+    while len(seen) < count:
+        day = now.date() + datetime.timedelta(days=rnd.randint(SHOW_DAYS.start, SHOW_DAYS.stop - 1))
+        if day.weekday() < 4 and rnd.random() < 0.4:
+            continue
+        start_time = datetime.datetime.combine(day, datetime.time(rnd.choice(SHOW_HOURS)))
+        show = (rnd.choices(artist_ids, cum_weights=artist_weights)[0],
+                rnd.choices(venue_ids, cum_weights=venue_weights)[0],
+                start_time)
+        if show not in seen:
+            seen.add(show)
+            yield {"artist_id": show[0], "venue_id": show[1], "start_time": show[2]}
+
+
+def write(engine, table, records, batch_size, links=()):
+    """Inserts `records` in batches, returning the ids of the new rows."""
+    with engine.connect() as connection:
+        first_id = connection.execute(f'SELECT coalesce(max(id), 0) FROM "{table.name}"').scalar()
+    columns = None
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        columns = columns or [column for column in batch[0] if column in table.columns]
+        with engine.begin() as connection:
+            bulk_import.insert_records(connection, table, columns, batch, links)
+    with engine.connect() as connection:
+        return [record_id for (record_id,) in connection.execute(
+            f'SELECT id FROM "{table.name}" WHERE id > {int(first_id)} ORDER BY id')]
+
+
+def generate(engine, tables, venue_count, artist_count, show_count,
+             seed=0, batch_size=5000, now=None, report=print):
+    """
+    Adds the generated venues, artists and shows. `tables` maps 'venues',
+    'artists' and 'shows' to (table, links) as for bulk_import. Returns the
+    number of records added per kind. Raises ValueError, before writing
+    anything, when more shows are asked for than the venues and artists can
+    have (see `max_shows`).
+    """
+    if venue_count and artist_count and show_count > max_shows(venue_count, artist_count):
+        raise ValueError(f'{venue_count} venues and {artist_count} artists have at most '
+                         f'{max_shows(venue_count, artist_count)} distinct shows, not {show_count}')
+    rnd = random.Random(seed)
+    venue_table, venue_links = tables['venues']
+    artist_table, artist_links = tables['artists']
+    show_table, _ = tables['shows']
+    venue_ids = write(engine, venue_table, venues(rnd, venue_count), batch_size, venue_links)
+    report(f'{len(venue_ids)} venues')
+    artist_ids = write(engine, artist_table, artists(rnd, artist_count), batch_size, artist_links)
+    report(f'{len(artist_ids)} artists')
+    show_count = show_count if venue_ids and artist_ids else 0
+    records = shows(rnd, show_count, venue_ids, artist_ids, now or datetime.datetime.now())
+    columns = ['artist_id', 'venue_id', 'start_time']
+    written = 0
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        with engine.begin() as connection:
+            bulk_import.insert_records(connection, show_table, columns, batch)
+        written += len(batch)
+    report(f'{written} shows')
+    return {"venues": len(venue_ids), "artists": len(artist_ids), "shows": written}
@@ -0,0 +1,750 @@
+import io
+import os
+import gzip
+import json
+import queue
+import logging
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import random
+import datetime
+import contextlib
+from logging.handlers import QueueListener, RotatingFileHandler
+from sqlalchemy import event, func
+import flask_migrate
+
+# the tests recreate every table, keep them away from the development database
+# even when .env has set DB_NAME. TEST_DATABASE_URL runs them against another
+# database instead, e.g. sqlite:////tmp/fyyur_test.db; DATABASE_URL is ignored.
+os.environ['DB_NAME'] = 'fyyur_test'
+os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL', '')
+
+import config
+from app import app, create_app, db, Venue, Artist, Shows, fragment_cache, record_cache, shows_page, decode_show_cursor, \
+    split_search_terms, delete_records, archive_shows, ShowArchive, refresh_all_show_counters, name_indexes, browse, \
+    Genre, GENRES
+from applog import JSONFormatter, StructuredQueueHandler
+from online_migrations import lock_report
+from autocomplete import PrefixIndex
+import assets
+import partitions
+import synthetic
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# stand-in for a read replica: a second database with the same schema
+REPLICA_DATABASE_URL = os.getenv(
+    'TEST_REPLICA_DATABASE_URL',
+    default=config.SQLALCHEMY_DATABASE_URI.rsplit('/', 1)[0] + '/fyyur_test_replica')
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize the database."""
+        self.client = app.test_client
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        fragment_cache.clear()
+        record_cache.clear()
+        for name_index in name_indexes.values():
+            name_index.invalidate()
+        venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                      address='1015 Folsom Street', genres=['Jazz'])
+        artist = Artist(name='Guns N Petals', city='San Francisco', state='CA',
+                        genres=['Rock n Roll'])
+        db.session.add_all([venue, artist])
+        db.session.commit()
+        self.venue_id = venue.id
+        self.artist_id = artist.id
+
+    def tearDown(self):
+        """Executed after each test"""
+        db.session.remove()
+        self.app_context.pop()
+
+    def add_shows(self, count):
+        """Books `count` new artists at the venue and the artist at as many new venues."""
+        now = datetime.datetime.now()
+        for i in range(count):
+            artist = Artist(name=f'Artist {i}', city='Austin', state='TX', genres=['Jazz'])
+            venue = Venue(name=f'Venue {i}', city='Austin', state='TX',
+                          address=f'{i} Congress Ave', genres=['Jazz'])
+            db.session.add_all([artist, venue])
+            db.session.flush()
+            start_time = now + datetime.timedelta(days=i - count // 2, hours=12)
+            db.session.add(Shows(artist_id=artist.id, venue_id=self.venue_id, start_time=start_time))
+            db.session.add(Shows(artist_id=self.artist_id, venue_id=venue.id, start_time=start_time))
+        db.session.commit()
+
+    def count_queries(self, url):
+        """Requests `url` and returns the number of SQL statements it executed."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        fragment_cache.clear()
+        record_cache.clear()
+        # like a real request, start without the objects loaded by the test
+        db.session.remove()
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            res = self.client().get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(res.status_code, 200)
+        return len(statements)
+
+    def test_show_venue_query_count_is_constant(self):
+        url = f'/venues/{self.venue_id}'
+        self.add_shows(1)
+        few_shows = self.count_queries(url)
+        self.add_shows(25)
+        many_shows = self.count_queries(url)
+        self.assertEqual(few_shows, 3)
+        self.assertEqual(many_shows, few_shows)
+
+    def test_show_artist_query_count_is_constant(self):
+        url = f'/artists/{self.artist_id}'
+        self.add_shows(1)
+        few_shows = self.count_queries(url)
+        self.add_shows(25)
+        many_shows = self.count_queries(url)
+        self.assertEqual(few_shows, 3)
+        self.assertEqual(many_shows, few_shows)
+
+    def test_show_venue_splits_past_and_upcoming_shows(self):
+        self.add_shows(4)
+        res = self.client().get(f'/venues/{self.venue_id}')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'2 Upcoming Shows', res.data)
+        self.assertIn(b'2 Past Shows', res.data)
+
+    def test_show_venue_not_found(self):
+        res = self.client().get('/venues/99999999')
+        self.assertEqual(res.status_code, 404)
+
+    def test_shows_pages_cover_every_show_once(self):
+        self.add_shows(7)
+        seen = []
+        after = None
+        while True:
+            rows, next_cursor = shows_page(after=after, per_page=3)
+            seen.extend((show.artist_id, show.venue_id) for show in rows)
+            if next_cursor is None:
+                break
+            after = decode_show_cursor(next_cursor)
+        self.assertEqual(len(seen), 14)
+        self.assertEqual(len(set(seen)), 14)
+
+    def test_shows_invalid_cursor(self):
+        res = self.client().get('/shows?after=yesterday')
+        self.assertEqual(res.status_code, 400)
+
+    def test_shows_invalid_ids(self):
+        for query in ('venue_id=abc', 'artist_id=1.5', 'venue_id=-1', 'artist_id=%201'):
+            res = self.client().get(f'/shows?{query}')
+            self.assertEqual(res.status_code, 400, query)
+
+    def test_split_search_terms(self):
+        self.assertEqual(split_search_terms('jazz in San Francisco'), (['Jazz'], 'San Francisco'))
+        self.assertEqual(split_search_terms('Rock n Roll and hip-hop'), (['Rock n Roll', 'Hip-Hop'], ''))
+        self.assertEqual(split_search_terms('The Musical Hop'), ([], 'Musical Hop'))
+
+    def test_show_venue_conditional_get(self):
+        url = f'/venues/{self.venue_id}'
+        res = self.client().get(url)
+        etag = res.headers['ETag']
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+
+    def test_page_etag_changes_with_the_templates_and_assets(self):
+        url = f'/venues/{self.venue_id}'
+        etag = self.client().get(url).headers['ETag']
+        with tempfile.TemporaryDirectory() as folder:
+            deployed = create_app({'ASSETS_BUILD_FOLDER': folder, 'PAGE_VERSION': None})
+            with deployed.app_context():
+                res = deployed.test_cli_runner().invoke(args=['build-assets'])
+            self.assertEqual(res.exit_code, 0, res.output)
+            # the manifest is read when the app is created, i.e. on deploy
+            deployed = create_app({'ASSETS_BUILD_FOLDER': folder, 'PAGE_VERSION': None})
+        self.assertNotEqual(deployed.config['PAGE_VERSION'], app.config['PAGE_VERSION'])
+        with deployed.app_context():
+            res = deployed.test_client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_edit_venue_invalidates_cached_page(self):
+        url = f'/venues/{self.venue_id}'
+        etag = self.client().get(url).headers['ETag']
+        res = self.client().post(f'{url}/edit', data={
+            'name': 'The Musical Hop Reloaded', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1015 Folsom Street', 'genres': ['Jazz', 'Swing'],
+        })
+        self.assertEqual(res.status_code, 302)
+        res = self.client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'The Musical Hop Reloaded', res.data)
+
+    def test_record_cache_counts_hits_and_is_invalidated_by_edits(self):
+        url = f'/venues/{self.venue_id}/edit'
+        before = record_cache.stats()
+        self.client().get(url)
+        self.assertIn(b'The Musical Hop', self.client().get(url).data)
+        caches = self.client().get('/_metrics').json['caches']
+        self.assertEqual(caches['records']['hits'] - before['hits'], 1)
+        self.assertEqual(caches['records']['misses'] - before['misses'], 1)
+        self.client().post(url, data={
+            'name': 'The Musical Hop Reloaded', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1015 Folsom Street', 'genres': ['Jazz'],
+        })
+        self.assertIn(b'The Musical Hop Reloaded', self.client().get(url).data)
+        self.assertEqual(record_cache.stats()['misses'] - before['misses'], 2)
+
+    def test_shows_json_time_range(self):
+        self.add_shows(6)
+        start = datetime.datetime.now()
+        end = start + datetime.timedelta(days=30)
+        res = self.client().get(
+            f'/shows?venue_id={self.venue_id}&from={start.isoformat()}&to={end.isoformat()}',
+            headers={'Accept': 'application/json'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json['shows']), 3)
+        for show in res.json['shows']:
+            self.assertEqual(show['venue_id'], self.venue_id)
+            self.assertGreaterEqual(show['start_time'], start.isoformat())
+        self.assertIsNone(res.json['next'])
+
+    def test_read_only_views_use_replica_until_client_writes(self):
+        app.config['SQLALCHEMY_BINDS'] = {'replica': REPLICA_DATABASE_URL}
+        try:
+            replica = db.get_engine(app, bind='replica')
+            db.Model.metadata.drop_all(replica)
+            db.Model.metadata.create_all(replica)
+            replica.execute(Venue.__table__.insert(), name='Replica Hall', city='Austin',
+                            state='TX', address='1 Replica Road')
+            client = self.client()
+            res = client.get('/venues')
+            self.assertIn(b'Replica Hall', res.data)
+            self.assertNotIn(b'The Musical Hop', res.data)
+            # after a write the client reads its own changes from the primary
+            client.post('/venues/create', data={
+                'name': 'Primary Palace', 'city': 'Austin', 'state': 'TX',
+                'address': '1 Primary Road', 'genres': ['Jazz', 'Blues']})
+            res = client.get('/venues')
+            self.assertIn(b'Primary Palace', res.data)
+            self.assertNotIn(b'Replica Hall', res.data)
+        finally:
+            app.config['SQLALCHEMY_BINDS'] = None
+
+    def test_lagging_replica_does_not_fill_the_cache_of_a_writer(self):
+        app.config['SQLALCHEMY_BINDS'] = {'replica': REPLICA_DATABASE_URL}
+        try:
+            replica = db.get_engine(app, bind='replica')
+            db.Model.metadata.drop_all(replica)
+            db.Model.metadata.create_all(replica)
+            # the replica has not caught up with the edit below yet
+            replica.execute(Venue.__table__.insert(), id=self.venue_id, name='The Musical Hop',
+                            city='San Francisco', state='CA', address='1015 Folsom Street')
+            writer, reader = self.client(), self.client()
+            url = f'/venues/{self.venue_id}'
+            writer.post(f'{url}/edit', data={
+                'name': 'The Musical Hop Reloaded', 'city': 'San Francisco', 'state': 'CA',
+                'address': '1015 Folsom Street', 'genres': ['Jazz']})
+            self.assertNotIn(b'Reloaded', reader.get(url).data)
+            # requests share the test's app context, end its session like a request would
+            db.session.remove()
+            self.assertIn(b'The Musical Hop Reloaded', writer.get(url).data)
+            self.assertIn(b'The Musical Hop Reloaded', writer.get(f'{url}/edit').data)
+        finally:
+            app.config['SQLALCHEMY_BINDS'] = None
+
+    def test_batch_show_creation_reports_failed_rows(self):
+        other = Artist(name='Tour Band', city='Austin', state='TX', genres=['Jazz'])
+        db.session.add(other)
+        db.session.commit()
+        tomorrow = (datetime.datetime.now() + datetime.timedelta(days=1)).isoformat()
+        res = self.client().post('/shows/create/batch', json={'shows': [
+            {'artist_id': self.artist_id, 'venue_id': self.venue_id, 'start_time': tomorrow},
+            {'artist_id': self.artist_id, 'venue_id': self.venue_id, 'start_time': tomorrow},
+            {'artist_id': other.id, 'venue_id': 99999999, 'start_time': tomorrow},
+            {'artist_id': other.id, 'venue_id': self.venue_id, 'start_time': 'soon'},
+            {'artist_id': other.id, 'venue_id': self.venue_id, 'start_time': tomorrow},
+        ]})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json['created'], 2)
+        self.assertEqual([failure['row'] for failure in res.json['failures']], [2, 3, 4])
+        self.assertEqual(Shows.query.count(), 2)
+        db.session.expire_all()
+        self.assertEqual(Venue.query.get(self.venue_id).upcoming_shows_count, 2)
+
+    def test_batch_show_creation_refuses_fractional_ids_and_utc_offsets(self):
+        tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+        res = self.client().post('/shows/create/batch', json={'shows': [
+            {'artist_id': self.artist_id + 0.9, 'venue_id': self.venue_id, 'start_time': tomorrow.isoformat()},
+            {'artist_id': True, 'venue_id': self.venue_id, 'start_time': tomorrow.isoformat()},
+            {'artist_id': self.artist_id, 'venue_id': self.venue_id, 'start_time': tomorrow.isoformat() + '+02:00'},
+            {'artist_id': float(self.artist_id), 'venue_id': str(self.venue_id), 'start_time': tomorrow.isoformat()},
+        ]})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([failure['row'] for failure in res.json['failures']], [1, 2, 3])
+        self.assertIn('UTC offset', res.json['failures'][2]['error'])
+        self.assertEqual(res.json['created'], 1)
+        self.assertEqual(Shows.query.one().start_time, tomorrow)
+
+    def test_delete_venue_deletes_its_shows(self):
+        self.add_shows(4)
+        res = self.client().delete(f'/venues/{self.venue_id}')
+        self.assertEqual(res.status_code, 307)
+        db.session.expire_all()
+        self.assertIsNone(Venue.query.get(self.venue_id))
+        self.assertEqual(Shows.query.filter_by(venue_id=self.venue_id).count(), 0)
+        # the artists of the deleted shows only keep the shows at other venues
+        artist = Artist.query.filter_by(name='Artist 0').one()
+        self.assertEqual(artist.past_shows_count + artist.upcoming_shows_count, 0)
+        self.assertEqual(Shows.query.filter_by(artist_id=self.artist_id).count(), 4)
+
+    def test_delete_records_deletes_artists_and_their_shows(self):
+        self.add_shows(3)
+        artist_ids = [artist.id for artist in Artist.query.filter(Artist.name.like('Artist %'))]
+        self.assertEqual(delete_records(Artist, artist_ids), 3)
+        self.assertEqual(Artist.query.count(), 1)
+        self.assertEqual(Shows.query.filter_by(venue_id=self.venue_id).count(), 0)
+        self.assertEqual(Venue.query.get(self.venue_id).upcoming_shows_count, 0)
+
+    def test_archived_shows_are_listed_on_request(self):
+        # the show counters are left stale: archived shows are counted in ShowArchive
+        self.add_shows(4)
+        # the two past shows of the venue, shifted by 12 hours, started a day or two ago
+        moved = archive_shows(datetime.datetime.now() - datetime.timedelta(hours=6), batch_size=1)
+        self.assertEqual(moved, 4)
+        self.assertEqual(ShowArchive.query.count(), 4)
+        self.assertEqual(Shows.query.count(), 4)
+        url = f'/venues/{self.venue_id}'
+        res = self.client().get(url)
+        self.assertIn(b'2 Past Shows', res.data)
+        self.assertIn(b'Show 2 older shows', res.data)
+        self.assertNotIn(b'Artist 0', res.data)
+        res = self.client().get(url + '?history=1')
+        self.assertIn(b'2 Past Shows', res.data)
+        self.assertIn(b'Artist 0', res.data)
+        self.assertNotIn(b'older shows', res.data)
+
+    def test_roll_forward_moves_started_shows_to_the_past_counters(self):
+        other = Venue(name='Late Bar', city='Austin', state='TX', address='2 Main', genres=['Jazz'])
+        db.session.add(other)
+        db.session.flush()
+        next_week = datetime.datetime.now() + datetime.timedelta(days=7)
+        show = Shows(artist_id=self.artist_id, venue_id=self.venue_id, start_time=next_week)
+        late_show = Shows(artist_id=self.artist_id, venue_id=other.id, start_time=next_week)
+        db.session.add_all([show, late_show])
+        db.session.commit()
+        refresh_all_show_counters()
+        # time passes: one show started ten minutes ago, the other three hours ago
+        now = datetime.datetime.now()
+        db.session.query(Shows).filter_by(venue_id=self.venue_id) \
+            .update({'start_time': now - datetime.timedelta(minutes=10)})
+        db.session.query(Shows).filter_by(venue_id=other.id) \
+            .update({'start_time': now - datetime.timedelta(hours=3)})
+        db.session.commit()
+        other_id = other.id
+        db.session.remove()
+        res = app.test_cli_runner().invoke(args=['roll-forward-shows', '--window', '60'])
+        self.assertIsNone(res.exception, res.output)
+        self.assertIn('Rolled 1 shows forward for 1 venues and 1 artists.', res.output)
+
+        def counters(model, record_id):
+            return tuple(db.session.query(
+                model.upcoming_shows_count, model.past_shows_count).filter_by(id=record_id).one())
+
+        self.assertEqual(counters(Venue, self.venue_id), (0, 1))
+        self.assertEqual(counters(Artist, self.artist_id), (0, 2))
+        # the show outside the window is left to --all
+        self.assertEqual(counters(Venue, other_id), (1, 0))
+        db.session.remove()
+        res = app.test_cli_runner().invoke(args=['roll-forward-shows', '--all'])
+        self.assertIsNone(res.exception, res.output)
+        self.assertEqual(counters(Venue, other_id), (0, 1))
+
+    def test_create_venue_with_a_single_genre(self):
+        res = self.client().post('/venues/create', data={
+            'name': 'Solo Hall', 'city': 'Austin', 'state': 'TX',
+            'address': '1 Solo Road', 'genres': 'Jazz'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Venue.query.filter_by(name='Solo Hall').one().genres, ['Jazz'])
+
+    def test_artist_autocomplete_by_prefix(self):
+        db.session.add(Artist(name='gunther', city='Austin', state='TX', genres=['Jazz']))
+        db.session.commit()
+        res = self.client().get('/artists/autocomplete?q=GUN')
+        self.assertEqual([artist['name'] for artist in res.get_json()['data']], ['Guns N Petals', 'gunther'])
+        # new artists are suggested right away, without reloading the index
+        self.client().post('/artists/create', data={
+            'name': 'Gunnar', 'city': 'Austin', 'state': 'TX', 'genres': 'Jazz'})
+        res = self.client().get('/artists/autocomplete?q=gun&limit=2')
+        self.assertEqual([artist['name'] for artist in res.get_json()['data']], ['Gunnar', 'Guns N Petals'])
+        # tables too large for the in-memory index are looked up in the database
+        name_index = name_indexes['artist']
+        name_index.max_entries, max_entries = 1, name_index.max_entries
+        name_index.invalidate()
+        try:
+            res = self.client().get('/artists/autocomplete?q=gun_')
+            self.assertEqual(res.get_json()['data'], [])
+            res = self.client().get('/artists/autocomplete?q=gunt')
+            self.assertEqual([artist['name'] for artist in res.get_json()['data']], ['gunther'])
+            # in the same order as the in-memory index
+            res = self.client().get('/artists/autocomplete?q=gun')
+            self.assertEqual([artist['name'] for artist in res.get_json()['data']],
+                             ['Gunnar', 'Guns N Petals', 'gunther'])
+        finally:
+            name_index.max_entries = max_entries
+
+    def test_autocomplete_matches_the_same_names_in_memory_and_in_the_database(self):
+        db.session.add(Venue(name='THE MUSICAL  Hall', city='Austin', state='TX', address='1 Road'))
+        db.session.commit()
+        queries = ['the musical', 'THE   Musical', ' the musical  h', 'the musical  ha']
+        in_memory = [self.client().get(f'/venues/autocomplete?q={q}').get_json()['data'] for q in queries]
+        name_index = name_indexes['venue']
+        name_index.max_entries, max_entries = 1, name_index.max_entries
+        name_index.invalidate()
+        try:
+            in_database = [self.client().get(f'/venues/autocomplete?q={q}').get_json()['data'] for q in queries]
+        finally:
+            name_index.max_entries = max_entries
+        self.assertEqual(in_memory, in_database)
+        self.assertEqual([[venue['name'] for venue in matches] for matches in in_memory[1:3]],
+                         [['THE MUSICAL  Hall', 'The Musical Hop'], ['The Musical Hop']])
+
+    def test_prefix_index_reloads_once_at_a_time(self):
+        loads, release = [], threading.Event()
+
+        def load():
+            loads.append(1)
+            if len(loads) > 1:
+                release.wait(5)
+            return [(1, 'Gunther')]
+
+        name_index = PrefixIndex(load, ttl=0)
+        self.assertEqual(name_index.search('gun'), [(1, 'Gunther')])
+        # the TTL expired: one thread reloads, the others use the loaded names
+        reloading = threading.Thread(target=name_index.search, args=('gun',))
+        reloading.start()
+        while len(loads) < 2:
+            pass
+        for _ in range(5):
+            self.assertEqual(name_index.search('gun'), [(1, 'Gunther')])
+        release.set()
+        reloading.join()
+        self.assertEqual(len(loads), 2)
+
+    def test_prefix_index_counts_tables_too_large_instead_of_loading_them(self):
+        counts, load = [], mock.Mock(return_value=[])
+        name_index = PrefixIndex(load, lambda: counts.append(1) or 11, max_entries=10, ttl=60)
+        self.assertIsNone(name_index.search('gun'))
+        self.assertIsNone(name_index.search('gun'))
+        self.assertEqual((len(counts), load.call_count), (1, 0))
+        name_index.invalidate()
+        self.assertIsNone(name_index.search('gun'))
+        self.assertEqual((len(counts), load.call_count), (2, 0))
+
+    def test_browse_venues_with_facet_counts(self):
+        db.session.add_all([
+            Venue(name='Blue Note', city='New York', state='NY', address='131 W 3rd St',
+                  genres=['Jazz', 'Blues']),
+            Venue(name='Rock Hall', city='New York', state='NY', address='1 Rock Road',
+                  genres=['Rock n Roll']),
+            Venue(name='Jazz Loft', city='Buffalo', state='NY', address='1 Loft Lane', genres=['Jazz']),
+        ])
+        db.session.commit()
+        results = browse(Venue, 1, 10, genre='Jazz')
+        self.assertEqual(results['count'], 3)
+        self.assertEqual([venue['name'] for venue in results['data']], ['Blue Note', 'Jazz Loft', 'The Musical Hop'])
+        self.assertEqual(results['facets']['genres'], [
+            {'genre': 'Jazz', 'count': 3}, {'genre': 'Blues', 'count': 1}])
+        self.assertEqual(results['facets']['states'], [
+            {'state': 'NY', 'count': 2}, {'state': 'CA', 'count': 1}])
+        self.assertEqual(results['facets']['cities'], [
+            {'state': 'CA', 'city': 'San Francisco', 'count': 1},
+            {'state': 'NY', 'city': 'Buffalo', 'count': 1},
+            {'state': 'NY', 'city': 'New York', 'count': 1}])
+        res = self.client().get('/venues/browse?genre=Jazz&state=NY')
+        self.assertIn(b'Blue Note', res.data)
+        self.assertNotIn(b'Rock Hall', res.data)
+        self.assertNotIn(b'The Musical Hop', res.data)
+
+    def import_file(self, entity, file_name, content, *options):
+        """Runs `flask import-data` on a file holding `content`."""
+        db.session.remove()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, file_name)
+            with open(path, 'w') as f:
+                f.write(content)
+            return app.test_cli_runner().invoke(args=['import-data', entity, path, *options])
+
+    def test_import_artists_from_json_lines(self):
+        res = self.import_file('artists', 'artists.jsonl', '\n'.join(json.dumps(artist) for artist in [
+            {"name": "Sax Band", "city": "Austin", "state": "TX", "genres": ["Jazz", "Blues"],
+             "facebook_link": "https://facebook.com/sax", "website": "https://sax.example.com"},
+            {"name": "Matt", "city": "Austin", "state": "TX", "genres": ["Folk"],
+             "facebook_link": "https://facebook.com/matt", "website": "https://matt.example.com"},
+        ]) + '\n')
+        self.assertIsNone(res.exception, res.output)
+        self.assertIn('Imported 2 artists, rejected 0.', res.output)
+        imported = {artist.name: list(artist.genres) for artist in Artist.query.filter_by(city='Austin')}
+        self.assertEqual(imported, {'Sax Band': ['Blues', 'Jazz'], 'Matt': ['Folk']})
+
+    def test_import_reports_invalid_rows_and_keeps_the_others(self):
+        links = 'https://example.com,https://facebook.com/fyyur'
+        res = self.import_file('venues', 'venues.csv', 'name,city,state,address,genres,website,facebook_link\n'
+                               f'Hop,Austin,TX,1 Main,Jazz,{links}\n'
+                               f'Nowhere,Austin,ZZ,2 Main,Jazz,{links}\n'
+                               f',Austin,TX,3 Main,Jazz,{links}\n')
+        self.assertIsNone(res.exception, res.output)
+        self.assertIn("row 2: {'state'", res.output)
+        self.assertIn("row 3: {'name'", res.output)
+        self.assertIn('Imported 1 venues, rejected 2.', res.output)
+        self.assertEqual([venue.name for venue in Venue.query.filter_by(city='Austin')], ['Hop'])
+
+    def test_import_shows_rejects_unknown_venues_and_refreshes_counters(self):
+        start_time = (datetime.datetime.now() + datetime.timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+        res = self.import_file('shows', 'shows.csv', 'artist_id,venue_id,start_time\n'
+                               f'{self.artist_id},{self.venue_id},{start_time}\n'
+                               f'{self.artist_id},{self.venue_id + 100},{start_time}\n'
+                               f'{self.artist_id},{self.venue_id},not a date\n',
+                               '--batch-size', '2')
+        self.assertIsNone(res.exception, res.output)
+        # the foreign key error rejects the batch, its valid row is inserted on retry
+        self.assertIn('row 2:', res.output)
+        self.assertIn('row 3:', res.output)
+        self.assertIn('Imported 1 shows, rejected 2.', res.output)
+        self.assertIn('Refreshed show counters.', res.output)
+        self.assertEqual(Shows.query.count(), 1)
+        self.assertEqual(Venue.query.get(self.venue_id).upcoming_shows_count, 1)
+
+    def test_import_stores_empty_fields_as_null_in_batches_and_single_rows(self):
+        links = 'https://example.com,https://facebook.com/fyyur'
+        content = ('name,city,state,address,genres,phone,website,facebook_link\n'
+                   f'Hop,Austin,TX,1 Main,Jazz,,{links}\n'
+                   f'Lot,Austin,TX,2 Main,Funk,,{links}\n')
+        # batches are copied on Postgres, single rows inserted
+        for batch_size in ('2', '1'):
+            res = self.import_file('venues', 'venues.csv', content, '--batch-size', batch_size)
+            self.assertIn('Imported 2 venues, rejected 0.', res.output)
+        phones = [venue.phone for venue in Venue.query.filter_by(city='Austin')]
+        self.assertEqual(phones, [None] * 4)
+
+    def test_import_keeps_valid_rows_of_a_rejected_batch_with_links(self):
+        if db.engine.dialect.name != 'postgresql':
+            self.skipTest('only Postgres enforces the length of Venue.city')
+        links = 'https://example.com,https://facebook.com/fyyur'
+        res = self.import_file('venues', 'venues.csv', 'name,city,state,address,genres,website,facebook_link\n'
+                               f'Hop,Austin,TX,1 Main,Jazz;Blues,{links}\n'
+                               f'Long,{"x" * 200},TX,2 Main,Jazz,{links}\n'
+                               f'Lot,Austin,TX,3 Main,Funk,{links}\n')
+        self.assertIsNone(res.exception, res.output)
+        self.assertIn('row 2: value too long', res.output)
+        self.assertIn('Imported 2 venues, rejected 1.', res.output)
+        imported = {venue.name: list(venue.genres) for venue in Venue.query.filter_by(city='Austin')}
+        self.assertEqual(imported, {'Hop': ['Blues', 'Jazz'], 'Lot': ['Funk']})
+
+    def test_generate_data_is_seeded_and_skewed(self):
+        db.session.remove()
+        res = app.test_cli_runner().invoke(args=[
+            'generate-data', '--venues', '50', '--artists', '100', '--shows', '1000', '--seed', '7'])
+        self.assertIsNone(res.exception, res.output)
+        self.assertEqual(Venue.query.count(), 51)
+        self.assertEqual(Shows.query.count(), 1000)
+        # the busiest venue gets far more than an even share of the shows
+        busiest = db.session.query(func.count()).select_from(Shows) \
+            .group_by(Shows.venue_id).order_by(func.count().desc()).first()[0]
+        self.assertGreater(busiest, 5 * 1000 / 50)
+        self.assertEqual(list(synthetic.venues(random.Random(7), 20)),
+                         list(synthetic.venues(random.Random(7), 20)))
+        # more shows than one venue and one artist can have fails up front
+        res = app.test_cli_runner().invoke(args=[
+            'generate-data', '--venues', '1', '--artists', '1', '--shows', str(synthetic.max_shows(1, 1) + 1)])
+        self.assertEqual(res.exit_code, 2)
+        self.assertIn('at most 2740 distinct shows', res.output)
+        self.assertEqual(Venue.query.count(), 51)
+        with self.assertRaises(ValueError):
+            next(synthetic.shows(random.Random(7), 3000, [1], [1], datetime.datetime.now()))
+
+    def test_built_assets_are_hashed_compressed_and_immutable(self):
+        self.assertEqual(
+            assets.rewrite_css('css/a.css', b'url("../fonts/a.woff?v=1")', {'fonts/a.woff': 'fonts/a.1f2e.woff'}),
+            b'url("../fonts/a.1f2e.woff?v=1")')
+        with tempfile.TemporaryDirectory() as folder:
+            manifest = assets.build(app.static_folder, folder)
+            client = create_app({'ASSETS_BUILD_FOLDER': folder}).test_client()
+            hashed = manifest['css/bootstrap.min.css']
+            self.assertIn(f'/static/{hashed}'.encode(), client.get('/').data)
+            res = client.get(f'/static/{hashed}', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', res.headers['Cache-Control'])
+            with open(os.path.join(app.static_folder, 'css', 'bootstrap.min.css'), 'rb') as f:
+                self.assertEqual(gzip.decompress(res.data), f.read())
+            res.close()
+
+    def test_precompiled_templates_are_not_compiled_again(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cold = create_app({'TEMPLATE_CACHE_FOLDER': folder})
+            with cold.app_context():
+                res = cold.test_cli_runner().invoke(args=['compile-templates'])
+            self.assertEqual(res.exit_code, 0, res.output)
+            self.assertEqual(len(os.listdir(folder)), len(app.jinja_env.list_templates()))
+            warm = create_app({'TEMPLATE_CACHE_FOLDER': folder})
+            with mock.patch.object(warm.jinja_env, 'compile', side_effect=AssertionError('compiled')):
+                self.assertEqual(warm.test_client().get('/').status_code, 200)
+
+    def test_templates_compiled_by_another_jinja_are_compiled_again(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with mock.patch('jinja2.__version__', '0.0'):
+                old = create_app({'TEMPLATE_CACHE_FOLDER': folder})
+            with old.app_context():
+                res = old.test_cli_runner().invoke(args=['compile-templates'])
+            self.assertEqual(res.exit_code, 0, res.output)
+            new = create_app({'TEMPLATE_CACHE_FOLDER': folder})
+            with mock.patch.object(new.jinja_env, 'compile', wraps=new.jinja_env.compile) as compile:
+                self.assertEqual(new.test_client().get('/').status_code, 200)
+            self.assertTrue(compile.called)
+
+    def test_create_app_does_not_connect(self):
+        # a worker starts while the database is down, only queries fail
+        offline = create_app({'SQLALCHEMY_DATABASE_URI': 'postgresql://fyyur@127.0.0.1:9/fyyur'})
+        res = offline.test_client().get('/venues/create')
+        self.assertEqual(res.status_code, 200)
+
+    def test_schema_bootstrap_creates_tables_on_first_request(self):
+        db.session.remove()
+        db.drop_all()
+        bootstrapped = create_app({
+            'SCHEMA_BOOTSTRAP': True,
+            'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI']})
+        res = bootstrapped.test_client().get('/venues')
+        self.assertEqual(res.status_code, 200)
+        with bootstrapped.app_context():
+            self.assertEqual(db.session.query(Genre).count(), len(GENRES))
+            db.session.remove()
+
+    def test_pool_wait_reported(self):
+        # give back the connection still held by setUp so the request checks one out
+        db.session.remove()
+        res = self.client().get(f'/venues/{self.venue_id}')
+        timings = res.headers.getlist('Server-Timing')
+        self.assertTrue(any(timing.startswith('db-pool-wait;dur=') for timing in timings))
+        self.assertIn('db-pool-in-use;desc=1', timings)
+        res = self.client().get('/_metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json['pools']['primary']['size'], config.DB_POOL_SIZE)
+        self.assertGreater(res.json['totals']['checkouts'], 0)
+
+    def test_queued_log_records_are_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'fyyur.log')
+            file_handler = RotatingFileHandler(path, maxBytes=1024 * 1024)
+            file_handler.setFormatter(JSONFormatter())
+            log_queue = queue.Queue(100)
+            listener = QueueListener(log_queue, file_handler)
+            logger = logging.getLogger('fyyur.test')
+            logger.addHandler(StructuredQueueHandler(log_queue))
+            listener.start()
+            try:
+                try:
+                    raise ValueError('boom')
+                except ValueError:
+                    logger.exception('Could not update venue %s', 7)
+                logger.error('GET /venues 200', extra={'status': 200, 'duration_ms': 1.5})
+            finally:
+                listener.stop()
+                logger.handlers.clear()
+                file_handler.close()
+            with open(path) as log_file:
+                failure, latency = [json.loads(line) for line in log_file]
+        self.assertEqual(failure['message'], 'Could not update venue 7')
+        self.assertIn('ValueError: boom', failure['exception'])
+        self.assertEqual(latency['status'], 200)
+        self.assertEqual(latency['duration_ms'], 1.5)
+
+    def test_migration_dry_run_covers_every_revision(self):
+        if db.engine.dialect.name != 'postgresql':
+            self.skipTest('the migrations target Postgres')
+        two_years_ago = datetime.datetime.now() - datetime.timedelta(days=730)
+        db.session.add(Shows(artist_id=self.artist_id, venue_id=self.venue_id, start_time=two_years_ago))
+        db.session.commit()
+        db.session.remove()
+        output = io.StringIO()
+        # no alembic_version table yet, so every revision is reported
+        with contextlib.redirect_stdout(output):
+            flask_migrate.upgrade(directory=MIGRATIONS, x_arg=['dry_run=true'])
+        # the partition revision read the oldest show from the database
+        self.assertIn(f'ATTACH PARTITION "Show_p{two_years_ago:%Y_%m}"', output.getvalue())
+        self.assertIn('CREATE INDEX CONCURRENTLY "ix_Artist_state_city"', output.getvalue())
+        self.assertFalse(db.engine.has_table('alembic_version'))
+
+    def test_partition_bounds_and_names(self):
+        self.assertEqual(partitions.month_start(datetime.datetime(2024, 12, 31, 23, 59)),
+                         datetime.datetime(2024, 12, 1))
+        self.assertEqual(partitions.add_months(datetime.datetime(2024, 12, 1), 1), datetime.datetime(2025, 1, 1))
+        self.assertEqual(partitions.add_months(datetime.datetime(2024, 1, 1), -1), datetime.datetime(2023, 12, 1))
+        self.assertEqual(partitions.add_months(datetime.datetime(2024, 3, 1), 22), datetime.datetime(2026, 1, 1))
+        self.assertEqual(partitions.partition_name(datetime.datetime(2025, 1, 1)), 'Show_p2025_01')
+
+    def test_create_show_partitions_twice_and_from_the_default_partition(self):
+        if db.engine.dialect.name != 'postgresql':
+            self.skipTest('Show is only partitioned on Postgres')
+        db.session.remove()
+        runner = app.test_cli_runner()
+        # create_all made the default partition and the coming twelve months
+        this_month = partitions.month_start(datetime.datetime.now())
+        res = runner.invoke(args=['create-show-partitions', '--months', '14'])
+        self.assertIsNone(res.exception, res.output)
+        names = [partitions.partition_name(partitions.add_months(this_month, count)) for count in (12, 13)]
+        self.assertIn(f'Created 2 partitions: {", ".join(names)}.', res.output)
+        res = runner.invoke(args=['create-show-partitions', '--months', '14'])
+        self.assertIn('Created 0 partitions: none.', res.output)
+        # a show beyond the partitions lands in Show_default until its month is created
+        later = partitions.add_months(this_month, 30) + datetime.timedelta(days=3, hours=20)
+        db.session.add(Shows(artist_id=self.artist_id, venue_id=self.venue_id, start_time=later))
+        db.session.commit()
+        partition_of_show = 'SELECT tableoid::regclass::text FROM "Show"'
+        self.assertEqual(db.session.execute(partition_of_show).scalar(), '"Show_default"')
+        db.session.remove()
+        res = runner.invoke(args=['create-show-partitions', '--months', '36'])
+        self.assertIn('Created 22 partitions', res.output)
+        self.assertEqual(db.session.execute(partition_of_show).scalar(), f'"{partitions.partition_name(later)}"')
+
+    def test_lock_report_of_online_not_null(self):
+        script = '''
+BEGIN;
+
+ALTER TABLE "Artist" ADD CONSTRAINT "Artist_phone_not_null" CHECK ("phone" IS NOT NULL) NOT VALID;
+
+COMMIT;
+
+ALTER TABLE "Artist" VALIDATE CONSTRAINT "Artist_phone_not_null";
+
+ALTER TABLE "Artist" ALTER COLUMN phone SET NOT NULL;
+
+ALTER TABLE "Venue" ALTER COLUMN phone SET NOT NULL;
+
+UPDATE alembic_version SET version_num='x' WHERE alembic_version.version_num = 'y';
+'''
+        report = lock_report(db.session.connection(), script)
+        self.assertEqual([(table, lock, seconds is None) for _, table, lock, seconds, _ in report], [
+            ('Artist', 'ACCESS EXCLUSIVE', True),
+            ('Artist', 'SHARE UPDATE EXCLUSIVE', False),
+            ('Artist', 'ACCESS EXCLUSIVE', True),
+            ('Venue', 'ACCESS EXCLUSIVE', False),
+        ])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()